@@ -1,10 +1,14 @@
 import os
 import shutil
+import threading
 import magic
 from tqdm import tqdm
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from file_index import get_file_index, indexed_files
+from file_signature import OLE_SIGNATURE, ZIP_SIGNATURE, sniff_file_type
 
 # ================== КОНФИГУРАЦИЯ ==================
 PROCESSED_DIR = Path("data/processed_files")  # Папка с исходными файлами
@@ -19,6 +23,27 @@ MIME_TO_EXT = {
     'text/rtf': '.rtf'
 }
 VALID_EXTENSIONS = {'.doc', '.docx', '.rtf'}
+USE_FILE_INDEX = True  # Брать список файлов и уже определённые типы из общего индекса (data/file_index.sqlite)
+SNIFF_BYTES = 8192  # Сколько байт с начала файла отдавать libmagic
+SNIFF_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # Потоков определения типа
+
+# Тип по сигнатуре (file_signature) -> расширение
+SIGNATURE_TO_EXT = {
+    'doc': '.doc',
+    'docx': '.docx',
+    'rtf': '.rtf'
+}
+# OLE-файлы, которые libmagic уверенно относит не к Word (по началу файла он часто
+# говорит только application/CDFV2, vnd.ms-office и т.п. - такие считаем DOC по сигнатуре)
+OTHER_OLE_MIMES = {
+    'application/vnd.ms-excel',
+    'application/vnd.ms-powerpoint',
+    'application/vnd.ms-outlook',
+    'application/vnd.visio',
+    'application/x-msi'
+}
+
+_local = threading.local()  # Свой дескриптор libmagic в каждом потоке
 
 
 # ================== ОСНОВНЫЕ ФУНКЦИИ ==================
@@ -28,13 +53,20 @@ def get_file_key(filepath):
     return filepath.stem.lower()  # Имя файла без расширения в нижнем регистре
 
 
+def list_processed_files():
+    """Файлы PROCESSED_DIR: из общего индекса (перечитываются только изменившиеся) или обходом папки"""
+    if USE_FILE_INDEX:
+        return [indexed.path for indexed in indexed_files(PROCESSED_DIR)]
+    return [filepath for filepath in PROCESSED_DIR.glob('*') if filepath.is_file()]
+
+
 def find_duplicate_files():
     """Находит файлы с одинаковыми именами, но разными расширениями"""
     files_by_key = defaultdict(list)
 
     # Собираем все файлы, группируя по ключу (имя без расширения)
-    for filepath in PROCESSED_DIR.glob('*.*'):
-        if filepath.is_file():
+    for filepath in list_processed_files():
+        if '.' in filepath.name:
             key = get_file_key(filepath)
             files_by_key[key].append(filepath)
 
@@ -61,22 +93,71 @@ def move_bad_files(valid_file, bad_files):
         if filepath != valid_file and filepath.suffix.lower() not in VALID_EXTENSIONS:
             target = BAD_EXT_DIR / filepath.name
             shutil.move(str(filepath), str(target))
+            if USE_FILE_INDEX:
+                get_file_index().moved(filepath, target)
             moved_files.append((filepath.name, target))
 
     return moved_files
 
+def get_magic():
+    """Дескриптор libmagic текущего потока (создаётся один раз)"""
+    if not hasattr(_local, 'magic'):
+        _local.magic = magic.Magic(mime=True)
+    return _local.magic
+
+
 def detect_file_type(filepath):
-    """Определяет реальный тип файла"""
+    """Определяет реальный тип файла по первым SNIFF_BYTES байтам.
+
+    Для OLE и ZIP решает сигнатура и каталог архива (sniff_file_type): по началу
+    файла libmagic не всегда отличает DOC/DOCX от других контейнеров и для целых
+    документов выдаёт application/vnd.ms-office, application/CDFV2-corrupt и т.п.
+    """
     try:
-        mime = magic.Magic(mime=True).from_buffer(open(filepath, 'rb').read())
+        with open(filepath, 'rb') as f:
+            header = f.read(SNIFF_BYTES)
+        mime = get_magic().from_buffer(header)
+
+        if header.startswith(ZIP_SIGNATURE):
+            return SIGNATURE_TO_EXT.get(sniff_file_type(filepath))  # Архив без word/document.xml - None
+        if header.startswith(OLE_SIGNATURE):
+            if mime in OTHER_OLE_MIMES:
+                return None  # xls, ppt и т.п.
+            return SIGNATURE_TO_EXT.get(sniff_file_type(filepath))
         return MIME_TO_EXT.get(mime)
     except Exception as e:
         print(f"Ошибка при определении типа файла {filepath.name}: {str(e)}")
         return None
 
-def fix_file_extension(filepath):
+
+def detect_file_types(filepaths):
+    """Определяет типы файлов параллельно: {путь: расширение или None}.
+
+    С общим индексом уже определённые типы берутся из него, новые сохраняются.
+    """
+    detected = {}
+    if USE_FILE_INDEX:
+        index = get_file_index()
+        wanted = set(filepaths)
+        for indexed in index.files(PROCESSED_DIR):
+            if indexed.path in wanted and indexed.real_ext is not None:
+                detected[indexed.path] = indexed.real_ext or None
+
+    to_sniff = [filepath for filepath in filepaths if filepath not in detected]
+    with ThreadPoolExecutor(max_workers=SNIFF_WORKERS) as pool:
+        results = pool.map(detect_file_type, to_sniff)
+        for filepath, real_ext in tqdm(zip(to_sniff, results), total=len(to_sniff), desc="Определение типов"):
+            detected[filepath] = real_ext
+            if USE_FILE_INDEX:
+                index.set_real_ext(filepath, real_ext or "")
+
+    if USE_FILE_INDEX:
+        index.commit()
+    return detected
+
+
+def fix_file_extension(filepath, real_ext):
     """Исправляет расширение файла на основе его реального типа"""
-    real_ext = detect_file_type(filepath)
     if not real_ext:
         return None
 
@@ -106,21 +187,24 @@ def process_files():
         total_renamed = 0
         total_moved = 0
 
-        for filepath in tqdm(list(PROCESSED_DIR.glob('*')), desc="Обработка файлов"):
+        # Типы определяются только для файлов с некорректным расширением, параллельно
+        bad_files = [filepath for filepath in list_processed_files()
+                     if filepath.suffix.lower() not in VALID_EXTENSIONS]
+        real_exts = detect_file_types(bad_files)
+
+        for filepath in tqdm(bad_files, desc="Обработка файлов"):
             if not filepath.is_file():
                 continue
 
             log.write(f"\nОбработка файла: {filepath.name}\n")
 
-            # Если расширение уже корректное, пропускаем
-            if filepath.suffix.lower() in VALID_EXTENSIONS:
-                continue
-
             # Определяем правильное имя файла
-            new_filepath = fix_file_extension(filepath)
+            new_filepath = fix_file_extension(filepath, real_exts.get(filepath))
             if new_filepath:
                 try:
                     filepath.rename(new_filepath)
+                    if USE_FILE_INDEX:
+                        get_file_index().moved(filepath, new_filepath)
                     log.write(f"Переименован: {filepath.name} -> {new_filepath.name}\n")
                     total_renamed += 1
                 except Exception as e:
@@ -130,6 +214,8 @@ def process_files():
                 BAD_EXT_DIR.mkdir(parents=True, exist_ok=True)
                 target = BAD_EXT_DIR / filepath.name
                 shutil.move(str(filepath), str(target))
+                if USE_FILE_INDEX:
+                    get_file_index().moved(filepath, target)
                 log.write(f"Перемещен в bad_ext: {filepath.name}\n")
                 total_moved += 1
 
@@ -137,6 +223,9 @@ def process_files():
         log.write(f"Переименовано файлов: {total_renamed}\n")
         log.write(f"Перемещено в bad_ext: {total_moved}\n")
 
+    if USE_FILE_INDEX:
+        get_file_index().commit()
+
     print(f"Готово! Переименовано: {total_renamed}, перемещено: {total_moved}. Лог сохранен в {LOG_FILE}")
 
 # ================== ЗАПУСК СКРИПТА ==================
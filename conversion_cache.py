@@ -0,0 +1,102 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+from pathlib import Path
+
+# ================== КОНФИГУРАЦИЯ ==================
+CACHE_FILE = Path("data/conversion_cache.sqlite")  # Общий кэш конвертаций для всех конвертеров
+CACHE_DIR = Path("data/conversion_cache")  # Копии готовых TXT, имя файла - хеш его содержимого
+HASH_CHUNK_SIZE = 1024 * 1024  # Размер блока чтения при хешировании
+
+
+# ================== ФУНКЦИИ ==================
+
+def compute_file_hash(filepath):
+    """Потоковый MD5 содержимого файла (без чтения файла целиком)"""
+    h = hashlib.md5()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ConversionCache:
+    """Кэш конвертаций: (хеш содержимого, версия конвертера) -> копия готового TXT.
+
+    Результат хранится копией в cache_dir под хешем своего содержимого, а не
+    ссылкой на выходной файл: выходной TXT может быть перезаписан другим
+    исходником с тем же именем (a.doc и a.rtf -> a.txt).
+    """
+
+    def __init__(self, db_path=CACHE_FILE, cache_dir=CACHE_DIR):
+        db_path = Path(db_path)
+        self.cache_dir = Path(cache_dir)
+        db_path.parent.mkdir(exist_ok=True, parents=True)
+        self.conn = sqlite3.connect(str(db_path), timeout=30)
+        # WAL позволяет нескольким процессам читать кэш, пока один пишет
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversions (
+                filehash TEXT NOT NULL,
+                converter TEXT NOT NULL,
+                txt_path TEXT NOT NULL,
+                source_name TEXT,
+                created_at REAL,
+                txthash TEXT,
+                size INTEGER,
+                PRIMARY KEY (filehash, converter)
+            )""")
+        # Кэш, созданный до появления копий: старые записи указывают на выходные файлы и не используются
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(conversions)")}
+        if "txthash" not in columns:
+            self.conn.execute("ALTER TABLE conversions ADD COLUMN txthash TEXT")
+            self.conn.execute("ALTER TABLE conversions ADD COLUMN size INTEGER")
+        self.conn.commit()
+
+    def _copy_path(self, txthash):
+        return self.cache_dir / txthash[:2] / txthash
+
+    def lookup(self, filehash, converter):
+        """Возвращает путь к копии ранее созданного TXT или None"""
+        row = self.conn.execute(
+            "SELECT txthash, size FROM conversions WHERE filehash = ? AND converter = ? AND txthash IS NOT NULL",
+            (filehash, converter)).fetchone()
+        if row is None:
+            return None
+        cached = self._copy_path(row[0])
+        try:
+            if cached.stat().st_size == row[1]:
+                return cached
+        except FileNotFoundError:
+            pass
+        return None
+
+    def restore(self, filehash, converter, txt_file):
+        """Копирует закэшированный TXT в txt_file. True, если в кэше была целая копия"""
+        cached = self.lookup(filehash, converter)
+        if cached is None:
+            return False
+        shutil.copyfile(cached, txt_file)
+        return True
+
+    def store(self, filehash, converter, txt_file, source_name=""):
+        """Запоминает результат конвертации: копирует TXT в cache_dir (одинаковый текст - одна копия)"""
+        txthash = compute_file_hash(txt_file)
+        cached = self._copy_path(txthash)
+        if not cached.is_file():
+            cached.parent.mkdir(exist_ok=True, parents=True)
+            tmp = cached.with_name(f".{txthash}.{os.getpid()}.tmp")
+            shutil.copyfile(txt_file, tmp)
+            os.replace(tmp, cached)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO conversions "
+            "(filehash, converter, txt_path, source_name, created_at, txthash, size) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (filehash, converter, str(cached.resolve()), source_name, time.time(), txthash,
+             cached.stat().st_size))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# ================== КОНФИГУРАЦИЯ ==================
+EVENTS_FILE = Path("data/conversion_events.sqlite")  # Общее хранилище событий всех конвертеров
+EVENTS_FLUSH_ROWS = 500  # Записывать события в базу каждые N штук...
+EVENTS_FLUSH_INTERVAL = 5  # ...или раз в N секунд
+
+STATUS_SUCCESS = "SUCCESS"
+STATUS_ERROR = "ERROR"
+
+# Класс ошибки по тексту сообщения, когда исключения уже нет (только строка из str(e))
+ERROR_PATTERNS = [
+    ("BadZipFile", re.compile(r"not a zip file|bad magic number|zip архив", re.I)),
+    ("KeyError", re.compile(r"there is no item named", re.I)),
+    ("TimeoutExpired", re.compile(r"timeout|timed out", re.I)),
+    ("UnicodeError", re.compile(r"codec can't (de|en)code", re.I)),
+    ("FileNotFoundError", re.compile(r"no such file|не найден", re.I)),
+    ("PermissionError", re.compile(r"permission denied|being used by another process", re.I)),
+    ("UnsupportedFormat", re.compile(r"unsupported format", re.I)),
+    ("NoOfficeBackend", re.compile(r"офисный конвертер недоступен|без Word", re.I)),
+    ("EmptyText", re.compile(r"пуст|empty", re.I)),
+]
+OTHER_ERROR = "Other"
+
+# Успешные операции, после которых у файла есть TXT (ERROR_MOVE и т.п. сюда не входят)
+CONVERTED_OPERATIONS = ("CONVERT", "CONVERT+MOVE", "CONVERTED", "CACHE_HIT")
+
+# Событие: (ts, operation, status, source_file, ext, target_file, file_format, error_class, error, filehash)
+_EVENT_COLUMNS = "ts, operation, status, source_file, ext, target_file, file_format, error_class, error, filehash"
+
+
+def classify_error(error):
+    """Класс ошибки: имя класса исключения или (для строки) класс по ERROR_PATTERNS"""
+    if error is None or error == "":
+        return ""
+    if isinstance(error, BaseException):
+        return type(error).__name__
+    for error_class, pattern in ERROR_PATTERNS:
+        if pattern.search(str(error)):
+            return error_class
+    return OTHER_ERROR
+
+
+def make_event(operation, status, source_file, target_file="", file_format="", error="",
+               error_class=None, filehash=""):
+    """Событие в виде кортежа (его можно передать из процесса пула в основной)"""
+    source_file = str(source_file)
+    ext = os.path.splitext(source_file)[1].lstrip('.').lower()
+    if error_class is None:
+        error_class = classify_error(error) if status == STATUS_ERROR else ""
+    return (time.time(), operation, status, source_file, ext, str(target_file), file_format,
+            error_class, str(error) if error else "", filehash or "")
+
+
+class EventStore:
+    """Хранилище событий конвертации (SQLite, только дописывание).
+
+    Вместо разбора текстовых логов регулярками каждое действие конвертера -
+    строка таблицы events с индексами по статусу, классу ошибки, файлу и времени.
+    События копятся в памяти и пишутся пачкой одной транзакцией.
+    """
+
+    def __init__(self, converter, db_path=EVENTS_FILE, flush_rows=EVENTS_FLUSH_ROWS,
+                 flush_interval=EVENTS_FLUSH_INTERVAL):
+        self.converter = converter
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.db_path = Path(db_path)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.conn = open_events_db(self.db_path)
+
+    def record(self, operation, status, source_file, target_file="", file_format="", error="",
+               error_class=None, filehash=""):
+        self.record_many([make_event(operation, status, source_file, target_file, file_format, error,
+                                     error_class, filehash)])
+
+    def record_many(self, events):
+        self.pending.extend(events)
+        if len(self.pending) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO events (converter, run_id, {_EVENT_COLUMNS}) "
+                    f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(self.converter, self.run_id, *event) for event in self.pending])
+            self.pending.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.flush()
+        self.conn.close()
+        self.conn = None
+
+
+def open_events_db(db_path=EVENTS_FILE):
+    db_path = Path(db_path)
+    db_path.parent.mkdir(exist_ok=True, parents=True)
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            converter TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            ts REAL NOT NULL,
+            operation TEXT NOT NULL,
+            status TEXT NOT NULL,
+            source_file TEXT NOT NULL,
+            ext TEXT NOT NULL,
+            target_file TEXT,
+            file_format TEXT,
+            error_class TEXT,
+            error TEXT,
+            filehash TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS events_status ON events (status, ext, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS events_error_class ON events (error_class, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS events_source_file ON events (source_file)")
+    conn.execute("CREATE INDEX IF NOT EXISTS events_ts ON events (ts)")
+    conn.commit()
+    return conn
+
+
+# ================== ЗАПРОСЫ ==================
+
+def parse_since(value):
+    """Начало периода: "7d", "12h", "30m", "today", "week" или дата "2024-05-01" """
+    if value is None:
+        return None
+    now = datetime.now()
+    if value == "today":
+        return now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    if value == "week":
+        monday = now - timedelta(days=now.weekday())
+        return monday.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    match = re.fullmatch(r"(\d+)([dhm])", value)
+    if match:
+        unit = {"d": "days", "h": "hours", "m": "minutes"}[match.group(2)]
+        return (now - timedelta(**{unit: int(match.group(1))})).timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+def build_query(columns, status=None, error_class=None, ext=None, converter=None, file=None,
+                since=None, until=None):
+    """SQL и параметры выборки событий по фильтрам (None - без фильтра)"""
+    conditions, params = [], []
+    for column, value in (("status", status), ("error_class", error_class), ("ext", ext),
+                          ("converter", converter)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if file is not None:
+        # Точное имя идет по индексу, шаблон с * - через GLOB
+        conditions.append("source_file GLOB ?" if "*" in file else "source_file = ?")
+        params.append(file)
+    if since is not None:
+        conditions.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("ts < ?")
+        params.append(until)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT {columns} FROM events{where}", params
+
+
+def query_events(conn, limit=None, **filters):
+    """События по фильтрам build_query, новые первыми"""
+    sql, params = build_query("ts, converter, operation, status, source_file, target_file, "
+                              "file_format, error_class, error", **filters)
+    sql += " ORDER BY ts DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return conn.execute(sql, params).fetchall()
+
+
+def failed_files(conn, extensions=None, **filters):
+    """Имена файлов, конвертация которых не удалась (по расширениям, если заданы).
+
+    Файл, который после ошибки всё же был сконвертирован (другим методом, при
+    повторе или в следующем запуске), не считается: нужна ошибка без более
+    поздней успешной конвертации.
+    """
+    sql, params = build_query("DISTINCT source_file", status=STATUS_ERROR, **filters)
+    if extensions:
+        sql += f" AND ext IN ({', '.join('?' * len(extensions))})"
+        params.extend(ext.lstrip('.').lower() for ext in extensions)
+    sql += (f" AND NOT EXISTS (SELECT 1 FROM events AS later"
+            f" WHERE later.source_file = events.source_file AND later.status = ? AND later.ts >= events.ts"
+            f" AND later.operation IN ({', '.join('?' * len(CONVERTED_OPERATIONS))}))")
+    params.append(STATUS_SUCCESS)
+    params.extend(CONVERTED_OPERATIONS)
+    return [name for (name,) in conn.execute(sql, params)]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Запросы к журналу событий конвертации")
+    parser.add_argument("--db", type=Path, default=EVENTS_FILE, help="Файл базы событий")
+    parser.add_argument("--status", type=str.upper, help="SUCCESS или ERROR")
+    parser.add_argument("--error-class", help="Класс ошибки, например BadZipFile")
+    parser.add_argument("--ext", type=str.lower, help="Расширение исходного файла: doc, docx, rtf")
+    parser.add_argument("--converter", help="main, docx-converter, missing_txt_files, ...")
+    parser.add_argument("--file", help="Имя исходного файла (можно шаблон с *)")
+    parser.add_argument("--since", help="С какого момента: 7d, 12h, today, week, 2024-05-01")
+    parser.add_argument("--until", help="До какого момента (формат как у --since)")
+    parser.add_argument("--limit", type=int, default=100, help="Сколько событий вывести (0 - все)")
+    parser.add_argument("--stats", action="store_true", help="Вместо событий - число событий по классам ошибок")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.db.exists():
+        print(f"❌ База событий не найдена: {args.db}")
+        return 1
+
+    conn = open_events_db(args.db)
+    filters = dict(status=args.status, error_class=args.error_class, ext=args.ext, converter=args.converter,
+                   file=args.file, since=parse_since(args.since), until=parse_since(args.until))
+    try:
+        if args.stats:
+            sql, params = build_query("status, error_class, COUNT(*)", **filters)
+            sql += " GROUP BY status, error_class ORDER BY COUNT(*) DESC"
+            for status, error_class, total in conn.execute(sql, params):
+                print(f"{total:>10}  {status:<8} {error_class or '-'}")
+            return 0
+
+        rows = query_events(conn, limit=args.limit, **filters)
+        for ts, converter, operation, status, source_file, target_file, file_format, error_class, error in rows:
+            when = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+            line = f"{when}  {converter:<18} {operation:<14} {status:<8} {source_file}"
+            if error_class:
+                line += f"  [{error_class}] {error}"
+            print(line)
+        print(f"📊 Событий: {len(rows)}", file=sys.stderr)
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
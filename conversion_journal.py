@@ -0,0 +1,181 @@
+import os
+import time
+from pathlib import Path
+
+try:
+    import fcntl  # Linux/macOS
+except ImportError:
+    fcntl = None
+    import msvcrt  # Windows
+
+# ================== КОНФИГУРАЦИЯ ==================
+JOURNAL_FSYNC = False  # fsync после каждой записи: переживает отключение питания, но медленнее
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024  # В режиме наблюдения журнал больше этого сжимается в простое
+
+# Состояния файла в журнале
+STATE_QUEUED = "queued"  # Взят в работу (поставлен в очередь)
+STATE_CONVERTING = "converting"  # Идёт конвертация
+STATE_CONVERTED = "converted"  # TXT записан, исходник ещё не перемещён
+STATE_MOVED = "moved"  # Исходник перемещён, файл обработан полностью
+STATE_FAILED = "failed"  # Конвертация не удалась, в этом проходе не повторяем
+FINAL_STATES = {STATE_MOVED, STATE_FAILED}
+
+
+# ================== БЛОКИРОВКА ==================
+
+class LockHeld(Exception):
+    """Lock-файл удерживает другой запущенный процесс"""
+
+    def __init__(self, pid):
+        super().__init__(f"Уже запущен другой процесс (PID {pid or '?'})")
+        self.pid = pid
+
+
+class ProcessLock:
+    """Advisory-блокировка lock-файла (fcntl.flock, на Windows msvcrt.locking).
+
+    Блокировку держит открытый дескриптор, поэтому после падения процесса она
+    снимается системой сама, и устаревший lock-файл удалять не нужно.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = None
+
+    def acquire(self):
+        f = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.seek(0)
+            pid = f.read().strip()
+            f.close()
+            raise LockHeld(pid)
+
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self.file = f
+
+    def release(self):
+        if self.file is None:
+            return
+        try:
+            self.file.seek(0)
+            self.file.truncate()
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
+            self.file = None
+
+
+# ================== ЖУРНАЛ ==================
+
+class ConversionJournal:
+    """Журнал состояний файлов (write-ahead, только дописывание).
+
+    Каждый переход - одна строка "время<TAB>состояние<TAB>имя файла", которая
+    пишется до соответствующего действия (или сразу после него). Строки пишутся
+    одним os.write в файл с O_APPEND, поэтому процессы пула могут писать в журнал
+    параллельно. При открытии журнал проигрывается: для каждого файла берётся
+    последнее состояние, оборванная последняя строка отбрасывается.
+
+    В памяти (states) держатся только незавершённые и упавшие файлы прошлого
+    запуска, прочитанные при открытии; полностью обработанные (moved) из неё
+    удаляются, новые файлы в неё не попадают, поэтому память не растёт с числом
+    обработанных файлов.
+    """
+
+    def __init__(self, path, replay=True):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.states = {}
+        if replay:
+            self.states, lines = self._read()
+            # Журнал разросся повторами - переписываем только последние состояния
+            if lines > 2 * len(self.states) + 1000:
+                self._rewrite()
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+
+    def _read(self):
+        """Последние состояния файлов из журнала (кроме перемещённых) и число строк"""
+        states = {}
+        lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    lines += 1
+                    if not line.endswith("\n"):
+                        break  # Строка оборвана при падении
+                    parts = line.rstrip("\n").split("\t", 2)
+                    if len(parts) != 3:
+                        continue
+                    if parts[1] == STATE_MOVED:
+                        states.pop(parts[2], None)
+                    else:
+                        states[parts[2]] = parts[1]
+        except FileNotFoundError:
+            pass
+        return states, lines
+
+    @staticmethod
+    def _format(states):
+        now = time.time()
+        return "".join(f"{now}\t{state}\t{name}\n" for name, state in states.items()).encode('utf-8')
+
+    def _rewrite(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, 'wb') as f:
+            f.write(self._format(self.states))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def record(self, name, state):
+        os.write(self.fd, f"{time.time()}\t{state}\t{name}\n".encode('utf-8'))
+        if JOURNAL_FSYNC:
+            os.fsync(self.fd)
+        if state == STATE_MOVED:
+            self.states.pop(name, None)
+        elif name in self.states:
+            self.states[name] = state
+
+    def compact(self, max_bytes=JOURNAL_COMPACT_BYTES):
+        """Сжимает разросшийся журнал на месте до последних состояний незавершённых файлов.
+
+        Вызывать, только когда ни один файл не в работе: файл переписывается через тот же
+        дескриптор (а не заменой), чтобы дескрипторы процессов пула остались действительны.
+        """
+        if os.fstat(self.fd).st_size <= max_bytes:
+            return False
+        states, _ = self._read()
+        os.ftruncate(self.fd, 0)
+        os.write(self.fd, self._format(states))
+        if JOURNAL_FSYNC:
+            os.fsync(self.fd)
+        return True
+
+    def interrupted(self):
+        """Файлы, обработка которых была прервана в прошлый раз: имя -> последнее состояние"""
+        return {name: state for name, state in self.states.items() if state not in FINAL_STATES}
+
+    def failed(self):
+        return {name for name, state in self.states.items() if state == STATE_FAILED}
+
+    def reset(self):
+        """Проход завершён: журнал больше не нужен"""
+        os.ftruncate(self.fd, 0)
+        self.states.clear()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
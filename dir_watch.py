@@ -0,0 +1,153 @@
+import os
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+from pathlib import Path
+
+# ================== КОНФИГУРАЦИЯ ==================
+DEBOUNCE_SECONDS = 2.0  # Файл считается дописанным, если размер и mtime не менялись столько секунд
+POLL_INTERVAL = 5.0  # Период сканирования папки, если inotify недоступен
+
+# Константы inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """Новые файлы папки через inotify (Linux): папка не пересканируется"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, "inotify_add_watch")
+        self.overflowed = False
+
+    def read_names(self, timeout):
+        """Имена файлов, появившихся за время ожидания (не дольше timeout секунд)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Очередь ядра переполнена: часть событий потеряна
+                self.overflowed = True
+            elif name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Запасной вариант без inotify: периодическое сканирование папки (только имена, без stat)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.known = self._scan()
+        self.overflowed = False
+
+    def _scan(self):
+        with os.scandir(self.directory) as entries:
+            return {entry.name for entry in entries}
+
+    def read_names(self, timeout):
+        time.sleep(timeout)
+        current = self._scan()
+        new_names = current - self.known
+        self.known = current
+        return list(new_names)
+
+    def close(self):
+        pass
+
+
+class DirectoryWatcher:
+    """Наблюдение за новыми файлами в папке: inotify, если доступен, иначе опрос"""
+
+    def __init__(self, directory, poll_interval=POLL_INTERVAL):
+        self.directory = Path(directory)
+        self.poll_interval = poll_interval
+        try:
+            self.backend = InotifyWatcher(self.directory)
+            self.kind = "inotify"
+        except (OSError, AttributeError):
+            self.backend = PollingWatcher(self.directory)
+            self.kind = "polling"
+
+    def read_names(self, timeout):
+        if self.kind == "polling":
+            timeout = max(timeout, self.poll_interval)
+        names = self.backend.read_names(timeout)
+        if self.backend.overflowed:
+            # События потеряны - один раз досканируем папку целиком
+            self.backend.overflowed = False
+            with os.scandir(self.directory) as entries:
+                names.extend(entry.name for entry in entries if entry.is_file())
+        return names
+
+    def close(self):
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def watch_directory(watcher, debounce=DEBOUNCE_SECONDS):
+    """Бесконечно выдает пути дописанных новых файлов.
+
+    Файл выдаётся, когда его размер и mtime не менялись debounce секунд.
+    Если готовых файлов нет, периодически выдаётся None, чтобы вызывающий
+    код мог сбросить логи и забрать результаты.
+    """
+    pending = {}  # имя -> ((размер, mtime), момент последнего изменения)
+    while True:
+        for name in watcher.read_names(debounce / 2 if pending else debounce):
+            pending.setdefault(name, None)
+
+        now = time.monotonic()
+        ready = []
+        for name, state in list(pending.items()):
+            try:
+                st = os.stat(watcher.directory / name)
+            except FileNotFoundError:
+                del pending[name]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if state is None or state[0] != signature:
+                pending[name] = (signature, now)
+            elif now - state[1] >= debounce:
+                del pending[name]
+                ready.append(watcher.directory / name)
+
+        if ready:
+            yield from ready
+        else:
+            yield None
@@ -3,12 +3,21 @@ import shutil
 import docx2txt
 from pathlib import Path
 from datetime import datetime
-import re
 from tqdm import tqdm
 import zipfile
 import time
-import win32com.client
 import tempfile
+from collections import defaultdict
+from itertools import islice
+from office_backend import get_office_backend, close_office_backend, OfficeBackendUnavailable, OfficeDocumentError
+from name_registry import NameRegistry, move_into
+from docx_text import text_part_names, read_part_text, DamagedPartError
+from conversion_cache import ConversionCache, compute_file_hash
+from file_signature import sniff_stream
+from dir_watch import DirectoryWatcher, watch_directory
+from source_scan import SourceScan
+from conversion_events import EventStore, classify_error
+from text_normalize import normalize_file, output_path, output_tag
 
 
 
@@ -21,9 +30,23 @@ LOG_DIR = Path("logs")
 LOG_FILE = LOG_DIR / f"convert_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
 
 MAX_RETRIES = 2
+RETRY_DELAY = 0.5  # Пауза между попытками (только для временных ошибок)
 MOVE_SUCCESS_FILES = True  # Не перемещать исходные файлы
 TEST_MODE = False  # Для тестирования на нескольких файлах
 TEST_COUNT = 10
+USE_CACHE = True  # Не конвертировать повторно файлы с уже известным содержимым
+CONVERTER_VERSION = "docx-converter-1"  # Менять при изменении логики конвертации (сбрасывает кэш)
+WATCH_MODE = False  # После обработки пачки следить за SOURCE_DIR и конвертировать новые файлы
+WORD_EXTENSIONS = (".doc", ".docx")
+SCAN_STATE_FILE = Path("data/docx_converter_scan.json")  # Число файлов прошлого прохода и курсор для продолжения
+USE_EVENT_STORE = True  # Дублировать лог событиями в data/conversion_events.sqlite (запросы: conversion_events.py)
+OFFICE_RETRY_INTERVAL = 300  # В режиме наблюдения не чаще раза в N секунд снова пробовать запустить офисный конвертер
+NORMALIZE_TEXT = True  # Нормализовать TXT после конвертации: пробелы, шаблонные строки, сжатие (text_normalize.py)
+
+_cache = None  # Кэш конвертаций, открывается при первом обращении
+_name_registries = {}  # Реестры занятых имён по папкам
+_events = None  # Хранилище событий, открывается при первом обращении
+_no_backend_files = set()  # Файлы, оставшиеся в SOURCE_DIR из-за недоступного офисного конвертера
 
 
 def setup_environment():
@@ -44,278 +67,371 @@ def setup_environment():
         return False
 
 
-def log_action(operation, source_file, target_file="", file_format="", status="SUCCESS", error=""):
-    """Логирование действий"""
+def get_events():
+    """Открывает хранилище событий"""
+    global _events
+    if _events is None:
+        _events = EventStore("docx-converter")
+    return _events
+
+
+def close_events():
+    global _events
+    if _events is not None:
+        _events.close()
+        _events = None
+
+
+def log_action(operation, source_file, target_file="", file_format="", status="SUCCESS", error="",
+               error_class=None):
+    """Логирование действий; error_class - класс итоговой ошибки (иначе определяется по тексту)"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
         with open(LOG_FILE, 'a', encoding='utf-8') as f:
             f.write(
                 f'"{timestamp}","{operation}","{source_file}","{target_file}","{file_format}","{status}","{error}"\n')
+        if USE_EVENT_STORE:
+            get_events().record(operation, status, source_file, target_file, file_format, error, error_class)
     except Exception as e:
         print(f"⚠️ Ошибка логирования: {e}")
 
 
+def get_name_registry(directory):
+    """Реестр имён папки: сканируется один раз за запуск"""
+    key = str(directory)
+    if key not in _name_registries:
+        _name_registries[key] = NameRegistry(directory)
+    return _name_registries[key]
+
+
 def get_unique_filename(directory, filename):
-    """Создает уникальное имя файла"""
-    filepath = Path(directory) / filename
-    if not filepath.exists():
-        return filename
+    """Создает уникальное имя файла (и метку .reserved для него, см. NameRegistry)"""
+    return get_name_registry(directory).reserve(filename)
+
+
+def commit_filename(directory, filename):
+    """Файл под именем из get_unique_filename записан - снимает метку"""
+    get_name_registry(directory).commit(filename)
+
+
+def release_filename(directory, filename):
+    """Освобождает имя, выданное get_unique_filename, удаляя файл под ним"""
+    get_name_registry(directory).release(filename)
+
+
+# Вид неудачной конвертации
+FAILURE_RETRYABLE = "retryable"  # Временная ошибка, имеет смысл повторить
+FAILURE_PERMANENT = "permanent"  # Файл битый, сразу в ERROR_DIR
+FAILURE_NO_BACKEND = "no_backend"  # Нет офисного конвертера, файл остаётся в исходной папке
+
+# Что нужно методу конвертации
+NEEDS_ZIP = "zip"
+NEEDS_OFFICE = "office"
+
+
+class ConversionError(Exception):
+    """Ошибка метода конвертации; retryable=False - повтор на тех же байтах не поможет.
+
+    error_class - класс исходной ошибки (BadZipFile, OfficeDocumentError, ...) для журнала событий.
+    """
 
-    name, ext = os.path.splitext(filename)
-    counter = 1
-    while True:
-        new_name = f"{name}({counter}){ext}"
-        new_filepath = Path(directory) / new_name
-        if not new_filepath.exists():
-            return new_name
-        counter += 1
+    def __init__(self, message, retryable=True, error_class=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.error_class = error_class or classify_error(message)
+
+
+# Детерминированные ошибки: повторная попытка даст тот же результат
+# (OfficeDocumentError - Word/LibreOffice работает, но не открывает именно этот файл)
+PERMANENT_ERRORS = (zipfile.BadZipFile, zipfile.LargeZipFile, KeyError, UnicodeError, EOFError,
+                    FileNotFoundError, IsADirectoryError, OfficeDocumentError, DamagedPartError)
+
+
+def is_retryable(error):
+    """Отличает временные ошибки (занятый файл, сбой COM) от постоянных (битый архив)"""
+    if isinstance(error, ConversionError):
+        return error.retryable
+    return not isinstance(error, PERMANENT_ERRORS)
+
+
+def conversion_error(prefix, error):
+    """Оборачивает ошибку метода, сохраняя признак повторяемости и класс исходной ошибки"""
+    error_class = error.error_class if isinstance(error, ConversionError) else type(error).__name__
+    return ConversionError(f"{prefix}: {str(error)}", is_retryable(error), error_class)
+
+
+class SourceFile:
+    """Исходный файл, открытый один раз на попытку конвертации.
+
+    Хранит формат, определённый по сигнатуре, открытый дескриптор и (для ZIP)
+    уже прочитанный центральный каталог, чтобы конвертеры не открывали файл заново.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(str(path), 'rb')
+        self.zip = None
+        self.format = "unknown"
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_source_file(file_path):
+    """Открывает файл и определяет формат ТОЛЬКО по сигнатуре, без учёта расширения"""
+    source = SourceFile(file_path)
+    try:
+        # Каталог архива читается здесь один раз и дальше переиспользуется
+        file_format, source.zip = sniff_stream(source.file)
+        # RTF и ZIP без word/document.xml перебираются как неизвестный формат
+        source.format = file_format if file_format in CONVERSION_METHODS else "unknown"
+    except Exception as e:
+        print(f"Ошибка при определении формата файла {file_path}: {str(e)}")
+    return source
 
 
 def detect_file_format(file_path):
     """Определяет формат файла ТОЛЬКО по сигнатуре, без учёта расширения"""
     try:
-        with open(str(file_path), 'rb') as f:
-            header = f.read(8)
-
-            # DOC сигнатура (D0CF11E0)
-            if header.startswith(b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'):
-                return "doc"
-
-            # DOCX сигнатура (PK...) + проверка внутренней структуры
-            if header.startswith(b'PK\x03\x04'):
-                try:
-                    with zipfile.ZipFile(str(file_path)) as zip_ref:
-                        files = zip_ref.namelist()
-                        # Проверяем, содержит ли документ правильную структуру DOCX
-                        if any('word/document.xml' in name for name in files):
-                            return "docx"
-                except:
-                    pass
-
-        # Не смогли определить формат
-        return "unknown"
+        with open_source_file(file_path) as source:
+            return source.format
     except Exception as e:
         print(f"Ошибка при определении формата файла {file_path}: {str(e)}")
         return "unknown"
 
-def convert_docx_to_txt(docx_path):
+
+def copy_source_to_temp(source, suffix):
+    """Копирует содержимое уже открытого исходника во временный файл"""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tf:
+        source.file.seek(0)
+        shutil.copyfileobj(source.file, tf)
+        return tf.name
+
+def convert_docx_to_txt(source):
     """Конвертирует DOCX через docx2txt"""
     try:
-        text = docx2txt.process(docx_path)
+        source.file.seek(0)
+        text = docx2txt.process(source.file)
         if not text or not isinstance(text, str):
-            raise Exception("Некорректный результат конвертации")
+            raise ConversionError("Некорректный результат конвертации", retryable=False, error_class="EmptyText")
         return text
     except Exception as e:
-        raise Exception(f"docx2txt: {str(e)}")
-
+        raise conversion_error("docx2txt", e)
 
-def extract_text_from_xml(xml_content):
-    """Извлекает текст из XML документа Word"""
-    result = []
-    # Находим все текстовые элементы
-    text_elements = re.findall(r'<w:t[^>]*>(.*?)</w:t>', xml_content, re.DOTALL)
-    for text in text_elements:
-        result.append(text)
-    return " ".join(result)
 
-
-def convert_docx_manually(docx_path):
+def convert_docx_manually(source):
     """Конвертирует DOCX вручную через ZIP-архив с улучшенной защитой от ошибок"""
     try:
         text_parts = []
 
-        # Пробуем открыть файл как ZIP архив
-        try:
-            with zipfile.ZipFile(docx_path, strictZIP=False) as zip_ref:
-                # Пытаемся извлечь содержимое разными способами
-                xml_files_to_check = [
-                    'word/document.xml',
-                    'word/document2.xml',
-                    'word/header1.xml',
-                    'word/footer1.xml'
-                ]
-
-                for xml_file in xml_files_to_check:
-                    try:
-                        with zip_ref.open(xml_file) as xml_file:
-                            content = xml_file.read().decode('utf-8', errors='replace')
-                            if '<w:t' in content:
-                                text_parts.append(extract_text_from_xml(content))
-                    except:
-                        continue
-
-                # Если основной документ не найден, проверяем все XML файлы
-                if not text_parts:
-                    for file_name in zip_ref.namelist():
-                        if file_name.endswith('.xml'):
-                            try:
-                                with zip_ref.open(file_name) as xml_file:
-                                    content = xml_file.read().decode('utf-8', errors='replace')
-                                    if '<w:t' in content:
-                                        text_parts.append(extract_text_from_xml(content))
-                            except:
-                                continue
-        except zipfile.BadZipFile:
-            raise Exception("Файл повреждён и не может быть открыт как ZIP архив")
+        # Используем каталог архива, прочитанный при определении формата
+        zip_ref = source.zip
+        if zip_ref is None:
+            try:
+                source.file.seek(0)
+                zip_ref = source.zip = zipfile.ZipFile(source.file)
+            except zipfile.BadZipFile:
+                raise ConversionError("Файл повреждён и не может быть открыт как ZIP архив", retryable=False,
+                                      error_class="BadZipFile")
+
+        # Тело документа и все колонтитулы, XML разбирается потоково
+        for part_name in text_part_names(zip_ref.namelist()):
+            text = read_part_text(zip_ref, part_name)
+            if text.strip():
+                text_parts.append(text)
+
+        # Если основной документ не найден, проверяем все XML файлы
+        if not text_parts:
+            for file_name in zip_ref.namelist():
+                if file_name.endswith('.xml'):
+                    text = read_part_text(zip_ref, file_name)
+                    if text.strip():
+                        text_parts.append(text)
 
         if not text_parts:
-            raise Exception("Не удалось найти текстовое содержимое в документе")
+            raise ConversionError("Не удалось найти текстовое содержимое в документе", retryable=False,
+                                  error_class="EmptyText")
 
         return "\n".join(text_parts)
     except Exception as e:
-        raise Exception(f"Ручная конвертация DOCX: {str(e)}")
+        raise conversion_error("Ручная конвертация DOCX", e)
 
-def convert_doc_to_txt_com(doc_path):
-    """Извлекает текст из DOC через MS Word (COM)"""
-    word = None
+def convert_with_office(source, suffix):
+    """Извлекает текст через долгоживущий офисный конвертер (MS Word COM или LibreOffice)"""
+    backend = get_office_backend()
     temp_file = None
     try:
-        # Создаём временный файл с расширением .doc
-        with tempfile.NamedTemporaryFile(suffix=".doc", delete=False) as tf:
-            temp_file = tf.name
-            with open(doc_path, 'rb') as src_file:
-                tf.write(src_file.read())
-
-        word = win32com.client.Dispatch("Word.Application")
-        word.visible = False
-        doc = word.Documents.Open(
-            os.path.abspath(temp_file),
-            ReadOnly=True,
-            ConfirmConversions=False,
-            Format=0,
-            NoEncodingDialog=True,
-            AddToRecentFiles=False,
-            Visible=False,
-            OpenAndRepair=True
-        )
-        text = doc.Content.Text
-        doc.Close(False)
+        # Создаём временный файл с нужным расширением из уже открытого исходника
+        temp_file = copy_source_to_temp(source, suffix)
+        text = backend.extract_text(temp_file)
         if not text or not isinstance(text, str):
-            raise Exception("Некорректный результат конвертации")
+            raise ConversionError("Некорректный результат конвертации", retryable=False, error_class="EmptyText")
         return text
+    except OfficeBackendUnavailable:
+        raise
     except Exception as e:
-        raise Exception(f"COM: {str(e)}")
+        raise conversion_error(backend.name, e)
     finally:
-        if word:
-            try:
-                word.Quit()
-            except:
-                pass
         if temp_file and os.path.exists(temp_file):
             try:
                 os.unlink(temp_file)
             except:
                 pass
 
-def convert_docx_to_txt_com(docx_path):
-    """Извлекает текст из повреждённого DOCX через MS Word (COM)"""
-    word = None
-    temp_file = None
-    try:
-        # Создаём временный файл с расширением .docx
-        with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tf:
-            temp_file = tf.name
-            with open(docx_path, 'rb') as src_file:
-                tf.write(src_file.read())
-
-        word = win32com.client.Dispatch("Word.Application")
-        word.visible = False
-        doc = word.Documents.Open(
-            os.path.abspath(temp_file),
-            ReadOnly=True,
-            ConfirmConversions=False,
-            Format=0,
-            NoEncodingDialog=True,
-            AddToRecentFiles=False,
-            Visible=False,
-            OpenAndRepair=True
-        )
-        text = doc.Content.Text
-        doc.Close(False)
-        if not text or not isinstance(text, str):
-            raise Exception("Некорректный результат конвертации")
-        return text
-    except Exception as e:
-        raise Exception(f"COM_DOCX: {str(e)}")
-    finally:
-        if word:
-            try:
-                word.Quit()
-            except:
-                pass
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
 
-def convert_to_txt(file_path, txt_path):
-    """Конвертирует файл в текст используя подходящий метод"""
-    file_format = detect_file_format(file_path)
-    errors = []
+def convert_doc_with_office(source):
+    """Извлекает текст из DOC через офисный конвертер"""
+    return convert_with_office(source, ".doc")
 
-    # 1. Ручная конвертация DOCX через ZIP-архив
-    if file_format == "docx":
-        try:
-            text = convert_docx_manually(file_path)
-            if text and isinstance(text, str) and len(text) > 0:
-                with open(txt_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                return True, "", file_format
-        except Exception as e:
-            errors.append(f"Ручная конвертация: {str(e)}")
 
-    # 2. docx2txt
-    if file_format == "docx":
-        try:
-            text = convert_docx_to_txt(file_path)
-            if text and isinstance(text, str) and len(text) > 0:
-                with open(txt_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                return True, "", file_format
-        except Exception as e:
-            errors.append(f"docx2txt: {str(e)}")
+def convert_docx_with_office(source):
+    """Извлекает текст из повреждённого DOCX через офисный конвертер (с восстановлением)"""
+    return convert_with_office(source, ".docx")
+
+
+# Методы по формату в исходном порядке: (название, функция, что нужно методу, относительная стоимость вызова)
+CONVERSION_METHODS = {
+    "docx": [
+        ("Ручная конвертация", convert_docx_manually, NEEDS_ZIP, 1),
+        ("docx2txt", convert_docx_to_txt, NEEDS_ZIP, 1),
+        ("Office_DOCX", convert_docx_with_office, NEEDS_OFFICE, 50),  # Office для повреждённых DOCX
+    ],
+    "doc": [
+        ("Office", convert_doc_with_office, NEEDS_OFFICE, 50),
+    ],
+    "unknown": [
+        ("Ручная конвертация DOCX", convert_docx_manually, NEEDS_ZIP, 1),
+        ("docx2txt", convert_docx_to_txt, NEEDS_ZIP, 1),
+        ("Office DOC", convert_doc_with_office, NEEDS_OFFICE, 50),
+        ("Office_DOCX", convert_docx_with_office, NEEDS_OFFICE, 50),
+    ],
+}
+
+_office_available = None
+
+# Статистика за запуск: (формат, метод) -> [успехов, попыток]
+method_stats = defaultdict(lambda: [0, 0])
 
-    # 3. COM для DOC
-    if file_format == "doc":
+
+def office_available():
+    """Есть ли на машине офисный конвертер (проверяется один раз)"""
+    global _office_available
+    if _office_available is None:
         try:
-            text = convert_doc_to_txt_com(file_path)
-            if text and isinstance(text, str) and len(text) > 0:
-                with open(txt_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                return True, "", file_format
-        except Exception as e:
-            errors.append(f"COM: {str(e)}")
+            get_office_backend()
+            _office_available = True
+        except OfficeBackendUnavailable:
+            _office_available = False
+    return _office_available
+
+
+def reset_office_backend():
+    """Закрывает офисный конвертер и забывает неудачный запуск: следующий файл запустит его заново"""
+    global _office_available
+    close_office_backend()
+    _office_available = None
+
 
-    # 4. COM для повреждённых DOCX (добавлено!)
-    if file_format == "docx":
+def ranked_methods(file_format):
+    """Методы для формата, упорядоченные по доле успехов на единицу стоимости"""
+    def score(method):
+        name, _, _, cost = method
+        successes, attempts = method_stats[(file_format, name)]
+        return (successes + 1) / (attempts + 2) / cost
+
+    # sorted устойчив: при равной оценке сохраняется исходный порядок
+    return sorted(CONVERSION_METHODS[file_format], key=score, reverse=True)
+
+
+def convert_to_txt(file_path, txt_path):
+    """Конвертирует файл в текст используя подходящий метод.
+
+    Возвращает (успех, ошибка, формат, вид ошибки: FAILURE_RETRYABLE/PERMANENT/NO_BACKEND,
+    класс итоговой ошибки для журнала событий).
+    """
+    # Файл и его ZIP-каталог открываются один раз на попытку и передаются всем методам
+    try:
+        source = open_source_file(file_path)
+    except Exception as e:
+        failure = FAILURE_RETRYABLE if is_retryable(e) else FAILURE_PERMANENT
+        return False, f"Не удалось открыть файл: {str(e)}", "unknown", failure, type(e).__name__
+
+    with source:
+        return convert_source_to_txt(source, txt_path)
+
+
+def convert_source_to_txt(source, txt_path):
+    """Перебирает методы конвертации для уже открытого исходника"""
+    file_format = source.format
+    errors = []
+    retryable = False
+    no_backend = False
+    last_error = None  # Ошибка последнего реально запущенного метода
+
+    for method_name, method_func, needs, _ in ranked_methods(file_format):
+        # Файл не читается как ZIP - методы, разбирающие архив, заведомо упадут
+        if needs == NEEDS_ZIP and source.zip is None and source.format == "unknown":
+            errors.append(f"{method_name}: пропущен, файл не является ZIP архивом")
+            continue
+        if needs == NEEDS_OFFICE and not office_available():
+            errors.append(f"{method_name}: пропущен, офисный конвертер недоступен")
+            no_backend = True
+            continue
+
+        stats = method_stats[(file_format, method_name)]
+        stats[1] += 1
         try:
-            text = convert_docx_to_txt_com(file_path)
+            text = method_func(source)
             if text and isinstance(text, str) and len(text) > 0:
                 with open(txt_path, 'w', encoding='utf-8') as f:
                     f.write(text)
-                return True, "", file_format
+                stats[0] += 1
+                if file_format == "unknown":
+                    return True, "", f"unknown (сработал {method_name})", "", ""
+                return True, "", file_format, "", ""
+        except OfficeBackendUnavailable as e:
+            # Конвертер не запустился; повторный запуск в этой пачке сразу упадёт тем же
+            errors.append(f"{method_name}: {str(e)}")
+            no_backend = True
         except Exception as e:
-            errors.append(f"COM_DOCX: {str(e)}")
-
-    # 5. Неизвестный формат — пробуем все методы
-    if file_format == "unknown":
-        for method_name, method_func in [
-            ("Ручная конвертация DOCX", convert_docx_manually),
-            ("docx2txt", convert_docx_to_txt),
-            ("COM Word", convert_doc_to_txt_com),
-            ("COM_DOCX", convert_docx_to_txt_com)
-        ]:
-            try:
-                text = method_func(file_path)
-                if text and isinstance(text, str) and len(text) > 0:
-                    with open(txt_path, 'w', encoding='utf-8') as f:
-                        f.write(text)
-                    return True, "", f"unknown (сработал {method_name})"
-            except Exception as e:
-                errors.append(f"{method_name}: {str(e)}")
+            errors.append(f"{method_name}: {str(e)}")
+            retryable = retryable or is_retryable(e)
+            last_error = e
+
+    message = f"Не удалось конвертировать: {'; '.join(errors)}"
+    if retryable:
+        failure = FAILURE_RETRYABLE
+    elif no_backend:
+        failure = FAILURE_NO_BACKEND
+    else:
+        failure = FAILURE_PERMANENT
+
+    # Класс ошибки - по итоговой причине, а не по первому совпадению в сводке всех попыток
+    if failure == FAILURE_NO_BACKEND:
+        error_class = "NoOfficeBackend"
+    elif isinstance(last_error, ConversionError):
+        error_class = last_error.error_class
+    elif last_error is not None:
+        error_class = type(last_error).__name__
+    else:
+        error_class = classify_error(message)
+    return False, message, file_format, failure, error_class
+
+def get_cache():
+    """Открывает кэш конвертаций"""
+    global _cache
+    if _cache is None:
+        _cache = ConversionCache()
+    return _cache
 
-    return False, f"Не удалось конвертировать: {'; '.join(errors)}", file_format
 
 def process_file(word_file):
     """Обработка одного файла"""
@@ -328,72 +444,170 @@ def process_file(word_file):
     success = False
     error_msg = ""
     file_format = "unknown"
+    failure = FAILURE_RETRYABLE
+    error_class = None
 
-    for attempt in range(MAX_RETRIES):
-        success, error_msg, file_format = convert_to_txt(word_file, txt_path)
-        if success:
-            break
-        time.sleep(0.5)  # Пауза между попытками
+    # Версия кэша меняется вместе с правилами нормализации и форматом вывода
+    cache_version = f"{CONVERTER_VERSION}/{output_tag()}" if NORMALIZE_TEXT else CONVERTER_VERSION
+    final_txt_path = output_path(txt_path) if NORMALIZE_TEXT else txt_path
+
+    # Файл с уже известным содержимым (переопубликованный под другим именем) берем из кэша
+    filehash = compute_file_hash(word_file) if USE_CACHE else None
+    if USE_CACHE and get_cache().restore(filehash, cache_version, final_txt_path):
+        success, file_format = True, "cached"
+    else:
+        for attempt in range(MAX_RETRIES):
+            success, error_msg, file_format, failure, error_class = convert_to_txt(word_file, txt_path)
+            # Постоянную ошибку (битый архив и т.п.) повтор не исправит
+            if success or failure != FAILURE_RETRYABLE:
+                break
+            if attempt + 1 < MAX_RETRIES:
+                time.sleep(RETRY_DELAY)  # Пауза между попытками
+
+        if success and NORMALIZE_TEXT:
+            try:
+                final_txt_path = normalize_file(txt_path)[0]
+            except Exception as e:
+                # Ненормализованный TXT не оставляем: исходник остаётся в папке до следующего запуска
+                success, failure, error_class = False, FAILURE_RETRYABLE, type(e).__name__
+                error_msg = f"Ошибка нормализации: {str(e)}"
+        if success and USE_CACHE:
+            get_cache().store(filehash, cache_version, final_txt_path, file_basename)
 
     if success:
+        # Имя x.txt после сжатия держит x.txt.zst
+        commit_filename(TXT_OUTPUT_DIR, unique_txt_name)
+        unique_txt_name = final_txt_path.name
         # Перемещаем файл при успешной конвертации (всегда, т.к. MOVE_SUCCESS_FILES = True)
         unique_processed_name = get_unique_filename(PROCESSED_DIR, file_basename)
         target_path = PROCESSED_DIR / unique_processed_name
         try:
-            shutil.move(word_file, target_path)
+            move_into(word_file, target_path)
+            commit_filename(PROCESSED_DIR, unique_processed_name)
             log_action("CONVERT+MOVE", file_basename, unique_txt_name, file_format, "SUCCESS")
         except Exception as e:
+            release_filename(PROCESSED_DIR, unique_processed_name)
             log_action("CONVERT+MOVE_ERROR", file_basename, unique_txt_name, file_format, "ERROR", str(e))
         return True
     else:
-        # Удаляем файл с ошибкой если создан
-        if os.path.exists(txt_path):
-            try:
-                os.remove(txt_path)
-            except:
-                pass
+        # Удаляем файл с ошибкой и метку имени
+        try:
+            release_filename(TXT_OUTPUT_DIR, unique_txt_name)
+        except:
+            pass
 
         # Логируем ошибку, но не выводим в консоль
-        log_action("CONVERT", file_basename, unique_txt_name, file_format, "ERROR", error_msg)
+        log_action("CONVERT", file_basename, unique_txt_name, file_format, "ERROR", error_msg, error_class)
+
+        # Без офисного конвертера файл остаётся на месте; в режиме наблюдения он будет повторён
+        if failure == FAILURE_NO_BACKEND:
+            _no_backend_files.add(word_file)
+
+        # Постоянно битые файлы сразу убираем в ERROR_DIR, временные ошибки остаются для следующего запуска
+        if failure == FAILURE_PERMANENT:
+            unique_error_name = get_unique_filename(ERROR_DIR, file_basename)
+            try:
+                move_into(word_file, ERROR_DIR / unique_error_name)
+                commit_filename(ERROR_DIR, unique_error_name)
+                log_action("ERROR_MOVE", file_basename, unique_error_name, file_format, "SUCCESS")
+            except Exception as e:
+                release_filename(ERROR_DIR, unique_error_name)
+                log_action("ERROR_MOVE", file_basename, unique_error_name, file_format, "ERROR", str(e))
         return False
 
 
 def process_files():
     """Обрабатывает файлы по одному"""
-    word_files = []
-    for pattern in ["*.doc", "*.docx"]:
-        word_files.extend(list(SOURCE_DIR.glob(pattern)))
-
-    if not word_files:
-        print("📂 Нет файлов для обработки в исходной папке.")
-        return 0, 0
-
-    # Сортировка для предсказуемой обработки
-    word_files.sort()
+    # Файлы берутся из каталога по мере обработки, без предварительного списка и сортировки
+    scan = SourceScan(SOURCE_DIR, SCAN_STATE_FILE, WORD_EXTENSIONS)
+    word_files = iter(scan)
+    total = scan.remaining_estimate()
 
     # Ограничение для тестового режима
-    file_count = len(word_files)
-    if TEST_MODE and TEST_COUNT < file_count:
-        word_files = word_files[:TEST_COUNT]
-        print(f"⚠️ ТЕСТОВЫЙ РЕЖИМ: обработка только первых {TEST_COUNT} файлов из {file_count}")
-    else:
-        print(f"📄 Найдено {len(word_files)} файлов для обработки.")
+    if TEST_MODE:
+        word_files = islice(word_files, TEST_COUNT)
+        total = TEST_COUNT if total is None else min(total, TEST_COUNT)
+        print(f"⚠️ ТЕСТОВЫЙ РЕЖИМ: обработка только первых {TEST_COUNT} файлов")
+    if scan.resumed:
+        print(f"⏩ Продолжение прерванного прохода, пропускается обработанных: {len(scan.done)}")
+    if total is not None:
+        print(f"📄 Примерно {total} файлов для обработки (по прошлому проходу).")
 
     successful = 0
     failed = 0
 
     # Обработка с улучшенным прогресс-баром
-    progress_bar = tqdm(total=len(word_files), desc="Конвертация", unit="файл")
+    progress_bar = tqdm(total=total, desc="Конвертация", unit="файл")
 
-    for word_file in word_files:
+    try:
+        for word_file in word_files:
+            if process_file(word_file):
+                successful += 1
+            else:
+                failed += 1
+            scan.mark_done(word_file)
+
+            # Обновляем описание прогресс-бара с текущими показателями
+            progress_bar.set_postfix(успешно=successful, ошибки=failed)
+            progress_bar.update(1)
+        scan.finish()
+    finally:
+        scan.close()
+        # Офисный конвертер запускается один раз на пачку и закрывается в конце
+        reset_office_backend()
+
+    progress_bar.close()
+    if successful + failed == 0:
+        print("📂 Нет файлов для обработки в исходной папке.")
+    return successful, failed
+
+def watch_files(watcher):
+    """Обрабатывает новые файлы по мере появления, пока не нажат Ctrl+C.
+
+    Файлы, оставшиеся без офисного конвертера (в том числе из пачки), повторяются
+    в паузах не чаще раза в OFFICE_RETRY_INTERVAL: конвертер запускается заново.
+    """
+    print(f"👀 Ожидание новых файлов в {SOURCE_DIR} ({watcher.kind}), Ctrl+C для остановки")
+    successful = 0
+    failed = 0
+    progress_bar = tqdm(desc="Новые файлы", unit="файл")
+    last_office_retry = time.monotonic()
+
+    def handle(word_file, retried=False):
+        nonlocal successful, failed
+        if retried:
+            failed -= 1  # Файл уже посчитан в ошибках (здесь или в итогах пачки)
         if process_file(word_file):
             successful += 1
         else:
             failed += 1
-
-        # Обновляем описание прогресс-бара с текущими показателями
         progress_bar.set_postfix(успешно=successful, ошибки=failed)
-        progress_bar.update(1)
+        if not retried:
+            progress_bar.update(1)
+
+    try:
+        for word_file in watch_directory(watcher):
+            if word_file is None:
+                # Новых файлов пока нет - сбрасываем накопленные события
+                if _events is not None:
+                    _events.flush()
+                if _no_backend_files and time.monotonic() - last_office_retry >= OFFICE_RETRY_INTERVAL:
+                    last_office_retry = time.monotonic()
+                    reset_office_backend()
+                    retry = [path for path in _no_backend_files if path.is_file()]
+                    _no_backend_files.clear()
+                    for path in retry:
+                        handle(path, retried=True)
+                continue
+            if word_file.suffix.lower() not in WORD_EXTENSIONS:
+                continue
+            if not word_file.is_file():
+                continue
+            handle(word_file)
+    except KeyboardInterrupt:
+        print("\n⛔ Наблюдение остановлено")
+    finally:
+        reset_office_backend()
 
     progress_bar.close()
     return successful, failed
@@ -411,9 +625,21 @@ def main():
     if not setup_environment():
         return
 
+    # Наблюдение включаем до сканирования, чтобы не пропустить файлы, пришедшие во время пачки
+    watcher = DirectoryWatcher(SOURCE_DIR) if WATCH_MODE else None
+
     # Обработка файлов
     start_time = datetime.now()
-    successful, failed = process_files()
+    try:
+        successful, failed = process_files()
+        if watcher is not None:
+            new_successful, new_failed = watch_files(watcher)
+            successful += new_successful
+            failed += new_failed
+    finally:
+        if watcher is not None:
+            watcher.close()
+        close_events()
     end_time = datetime.now()
     execution_time = (end_time - start_time).total_seconds()
 
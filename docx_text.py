@@ -0,0 +1,106 @@
+import re
+import zlib
+import zipfile
+import xml.etree.ElementTree as ET
+
+# ================== КОНФИГУРАЦИЯ ==================
+DOCUMENT_PART = "word/document.xml"  # Основная часть DOCX с текстом
+BODY_PART_RE = re.compile(r'^word/document(\d*)\.xml$')  # document.xml, document2.xml, ...
+HEADER_FOOTER_RE = re.compile(r'^word/(header|footer)(\d*)\.xml$')  # Все колонтитулы
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC_NS = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+W_P = W_NS + "p"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_BR = W_NS + "br"
+W_CR = W_NS + "cr"
+MC_FALLBACK = MC_NS + "Fallback"  # Дублирует содержимое mc:Choice, пропускаем
+
+
+class DamagedPartError(Exception):
+    """XML-часть архива повреждена: текст из неё прочитан бы не полностью"""
+
+
+# ================== ИЗВЛЕЧЕНИЕ ТЕКСТА ==================
+
+def iter_paragraphs(xml_stream):
+    """Потоково выдает текст абзацев (w:p) из XML-части документа Word.
+
+    Дерево не строится: каждый закрытый элемент сразу удаляется из родителя,
+    поэтому память ограничена глубиной вложенности, а не размером документа.
+    Сущности (&amp; и т.п.) декодирует сам XML-парсер.
+    """
+    stack = []  # Открытые элементы (нужны, чтобы отцеплять закрытые от родителя)
+    paragraphs = []  # Части текста открытых абзацев (абзацы бывают вложены, например в надписях)
+    skip_depth = 0  # > 0 внутри mc:Fallback
+
+    for event, elem in ET.iterparse(xml_stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            stack.append(elem)
+            if tag == MC_FALLBACK or skip_depth:
+                skip_depth += 1
+            elif tag == W_P:
+                paragraphs.append([])
+            continue
+
+        stack.pop()
+        if skip_depth:
+            skip_depth -= 1
+        elif paragraphs:
+            if tag == W_T:
+                paragraphs[-1].append(elem.text or "")
+            elif tag == W_TAB:
+                paragraphs[-1].append("\t")
+            elif tag in (W_BR, W_CR):
+                paragraphs[-1].append("\n")
+            elif tag == W_P:
+                yield "".join(paragraphs.pop())
+
+        if stack:
+            stack[-1].remove(elem)
+
+
+def write_paragraphs(paragraphs, out):
+    """Пишет непустые абзацы в файл через перевод строки. Возвращает их количество"""
+    count = 0
+    for text in paragraphs:
+        if not text.strip():
+            continue
+        if count:
+            out.write("\n")
+        out.write(text)
+        count += 1
+    return count
+
+
+def text_part_names(names):
+    """Выбирает из архива части с текстом: тело документа, затем все колонтитулы"""
+    body, headers, footers = [], [], []
+    for name in names:
+        match = BODY_PART_RE.match(name)
+        if match:
+            body.append((int(match.group(1) or 0), name))
+            continue
+        match = HEADER_FOOTER_RE.match(name)
+        if match:
+            target = headers if match.group(1) == "header" else footers
+            target.append((int(match.group(2) or 0), name))
+    return [name for group in (body, headers, footers) for _, name in sorted(group)]
+
+
+def read_part_text(zip_ref, part_name):
+    """Текст одной XML-части архива построчно по абзацам.
+
+    Обрезанная или битая часть - DamagedPartError: частичный текст не выдаётся
+    за успешную конвертацию, пусть документ разбирает следующий метод.
+    """
+    lines = []
+    try:
+        with zip_ref.open(part_name) as xml_stream:
+            for text in iter_paragraphs(xml_stream):
+                lines.append(text)
+    except (ET.ParseError, zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+        raise DamagedPartError(f"{part_name} повреждён: {str(e)}") from e
+    return "\n".join(lines)
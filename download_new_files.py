@@ -1,11 +1,21 @@
 import os
 import json
-import requests
+import asyncio
+import contextlib
+import httpx
+import aiofiles
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime
 from tqdm import tqdm
 import re
 import urllib.parse
+from itertools import islice
+
+try:
+    import h2  # HTTP/2 для httpx (pip install httpx[http2])
+except ImportError:
+    h2 = None
 
 # Конфигурация
 DB_CONFIG = {
@@ -18,8 +28,18 @@ DB_CONFIG = {
 TARGET_CATEGORY_PART = "долев"
 JSON_FILES_DIR = "data/json_zip"
 DOWNLOAD_DIR = "data/json_new_files"
+MAX_CONCURRENCY = 64  # Одновременных скачиваний всего...
+CONCURRENCY_PER_HOST = 8  # ...и на один сайт суда
+MAX_KEEPALIVE = 32  # Соединений, которые держим открытыми между запросами
+REQUEST_TIMEOUT = 30  # Таймаут запроса (секунды)
+CHUNK_SIZE = 64 * 1024  # Размер блока при записи на диск
+DB_BATCH_SIZE = 100  # Сколько скачанных документов записывать в базу одной транзакцией
+URL_CHECK_CHUNK = 1000  # Сколько ссылок проверять на наличие в базе одним запросом
+PARSE_BATCH = 500  # Сколько ссылок разбирать из JSON в отдельном потоке за один раз
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+_DONE = object()  # Метка конца очереди
+
 
 def log_message(message, level="INFO"):
     """Логирование с уровнем важности"""
@@ -27,133 +47,285 @@ def log_message(message, level="INFO"):
     print(f"[{timestamp}] [{level}] {message}")
 
 
-def download_file(url, save_path):
-    """Скачивание файла с прогресс-баром"""
-    try:
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-
-        total_size = int(response.headers.get('content-length', 0))
-        progress = tqdm(total=total_size, unit='B', unit_scale=True,
-                        desc=f"Скачивание {os.path.basename(save_path)}",
-                        leave=False)
-
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    progress.update(len(chunk))
-        progress.close()
-        return True
-    except Exception as e:
-        log_message(f"Ошибка скачивания {url}: {str(e)}", "WARNING")
-        return False
-
-
-def get_filename_from_url(url, attachment_name):
-    """Генерирует имя файла"""
-    try:
-        with requests.head(url, allow_redirects=True, timeout=5) as r:
-            if 'content-disposition' in r.headers:
-                content_disp = r.headers['content-disposition']
-                filename = re.findall('filename="?([^"]+)"?', content_disp)[0]
-                return filename
-
-        if attachment_name:
-            ext = os.path.splitext(url)[1] or '.pdf'
-            return f"{attachment_name}{ext}"
-
-        return f"doc_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    except:
-        return f"doc_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-
-def process_json_file(file_path, force_download=False):
-    """Обработка JSON файла с возможностью принудительного скачивания"""
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        stats = {
-            'total': 0,
-            'valid_json': 0,
-            'matching_category': 0,
-            'has_attachments': 0,
-            'valid_links': 0,
-            'new_links': 0,
-            'existing_links': 0
-        }
-
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in tqdm(f, desc=f"Обработка {os.path.basename(file_path)}"):
-                if not line.strip() or line.strip() == ',':
+def get_filename(url, attachment_name, headers):
+    """Генерирует имя файла по заголовкам ответа GET (без отдельного HEAD-запроса)"""
+    content_disp = headers.get('content-disposition', '')
+    # filename*=UTF-8''... (RFC 5987) приоритетнее обычного filename
+    match = re.search(r"filename\*=(?:[\w-]+)''([^;]+)", content_disp)
+    if match:
+        return urllib.parse.unquote(match.group(1).strip().strip('"'))
+    match = re.search(r'filename="?([^";]+)"?', content_disp)
+    if match:
+        return match.group(1)
+
+    if attachment_name:
+        ext = os.path.splitext(urllib.parse.urlparse(url).path)[1] or '.pdf'
+        return f"{attachment_name}{ext}"
+
+    return f"doc_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+def iter_links(file_path, stats):
+    """Ссылки на вложения нужной категории из JSON-файла: (ссылка, имя вложения)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in tqdm(f, desc=f"Обработка {os.path.basename(file_path)}"):
+            if not line.strip() or line.strip() == ',':
+                continue
+
+            stats['total'] += 1
+
+            try:
+                json_str = line.lstrip(',')
+                item = json.loads(json_str)
+                stats['valid_json'] += 1
+            except json.JSONDecodeError:
+                continue
+
+            if not isinstance(item, dict):
+                continue
+
+            # Проверка категории
+            category = str(item.get('category', '')).lower()
+            if TARGET_CATEGORY_PART.lower() not in category:
+                continue
+            stats['matching_category'] += 1
+
+            # Обработка вложений
+            attachments = item.get('attachments', [])
+            if not attachments:
+                continue
+            stats['has_attachments'] += 1
+
+            for attachment in attachments:
+                if not isinstance(attachment, dict):
                     continue
 
-                stats['total'] += 1
-
-                try:
-                    json_str = line.lstrip(',')
-                    item = json.loads(json_str)
-                    stats['valid_json'] += 1
-                except json.JSONDecodeError:
+                link = attachment.get('link')
+                if not isinstance(link, str) or not link.startswith('http'):
                     continue
+                stats['valid_links'] += 1
+                yield link, attachment.get('displayName', '')
 
-                if not isinstance(item, dict):
-                    continue
 
-                # Проверка категории
-                category = str(item.get('category', '')).lower()
-                if TARGET_CATEGORY_PART.lower() not in category:
-                    continue
-                stats['matching_category'] += 1
+async def iter_link_batches(file_path, stats):
+    """Пачки ссылок из iter_links, разобранные в отдельном потоке.
 
-                # Обработка вложений
-                attachments = item.get('attachments', [])
-                if not attachments:
-                    continue
-                stats['has_attachments'] += 1
+    Разбор JSON не блокирует цикл событий: пока поток читает следующую пачку,
+    скачивание и проверка ссылок по базе идут дальше.
+    """
+    links = iter_links(file_path, stats)
 
-                for attachment in attachments:
-                    if not isinstance(attachment, dict):
-                        continue
+    def read_batch():
+        return list(islice(links, PARSE_BATCH))
 
-                    link = attachment.get('link')
-                    if not isinstance(link, str) or not link.startswith('http'):
+    pending = asyncio.create_task(asyncio.to_thread(read_batch))
+    try:
+        while True:
+            batch = await pending
+            if not batch:
+                return
+            # Генератор продвигает только один поток за раз: следующая пачка - после готовности этой
+            pending = asyncio.create_task(asyncio.to_thread(read_batch))
+            yield batch
+    finally:
+        # Поток не прервать: дожидаемся начатой пачки и закрываем файл
+        await asyncio.gather(pending, return_exceptions=True)
+        links.close()
+
+
+# ================== СКАЧИВАНИЕ ==================
+
+class Downloader:
+    """Асинхронное скачивание: общий пул keep-alive соединений, лимит запросов на сайт"""
+
+    def __init__(self, client):
+        self.client = client
+        self.host_limits = {}  # Хост -> семафор
+        self.reserved = set()  # Имена, выданные в этом запуске (файлы ещё могут скачиваться)
+
+    def host_limit(self, url):
+        host = urllib.parse.urlparse(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(CONCURRENCY_PER_HOST)
+        return self.host_limits[host]
+
+    def reserve_filename(self, filename):
+        """Уникальное имя в DOWNLOAD_DIR: одинаковые имена в одну секунду не перезаписывают друг друга"""
+        safe_filename = re.sub(r'[\\/*?:"<>|]', '_', filename)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        final_filename = f"{timestamp}_{safe_filename}"
+        stem, ext = os.path.splitext(final_filename)
+        counter = 1
+        while final_filename in self.reserved or os.path.exists(os.path.join(DOWNLOAD_DIR, final_filename)):
+            final_filename = f"{stem}({counter}){ext}"
+            counter += 1
+        self.reserved.add(final_filename)
+        return final_filename
+
+    async def download(self, url, attachment_name):
+        """Скачивает файл потоком на диск. Возвращает имя файла или None"""
+        part_path = None
+        try:
+            async with self.host_limit(url):
+                async with self.client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    final_filename = self.reserve_filename(get_filename(url, attachment_name, response.headers))
+                    save_path = os.path.join(DOWNLOAD_DIR, final_filename)
+                    part_path = save_path + ".part"
+                    async with aiofiles.open(part_path, 'wb') as f:
+                        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                            await f.write(chunk)
+            os.replace(part_path, save_path)
+            return final_filename
+        except Exception as e:
+            log_message(f"Ошибка скачивания {url}: {str(e)}", "WARNING")
+            if part_path is not None and os.path.exists(part_path):
+                os.remove(part_path)
+            return None
+
+
+def create_client():
+    """HTTP-клиент на весь запуск: keep-alive и HTTP/2, если установлен h2"""
+    return httpx.AsyncClient(
+        http2=h2 is not None,
+        follow_redirects=True,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT),
+        limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_KEEPALIVE),
+    )
+
+
+# ================== БАЗА ДАННЫХ ==================
+
+def existing_urls(cursor, links):
+    """Какие из ссылок уже есть в базе: один запрос на пачку (по индексу url)"""
+    cursor.execute("SELECT url FROM saved_court_decisions WHERE url = ANY(%s)", (list(links),))
+    return {url for (url,) in cursor.fetchall()}
+
+
+def insert_documents(conn, rows):
+    """Записывает пачку скачанных документов одной транзакцией. Возвращает добавленные URL"""
+    now = datetime.now()
+    with conn.cursor() as cursor:
+        inserted = execute_values(
+            cursor,
+            """INSERT INTO saved_court_decisions
+            (source_id, download_date, url, original_file_name, txt_file_name, created_at, updated_at)
+            VALUES %s
+            ON CONFLICT (url) DO NOTHING
+            RETURNING url""",
+            [(1, now, link, final_filename, f"{final_filename}.txt", now, now) for link, final_filename in rows],
+            fetch=True)
+    conn.commit()
+    return {url for (url,) in inserted}
+
+
+async def db_writer(conn, results, stats):
+    """Единственный писатель в базу: собирает результаты скачивания в пачки"""
+    batch = []
+
+    async def flush():
+        insert = asyncio.ensure_future(asyncio.to_thread(insert_documents, conn, batch))
+        try:
+            inserted = await asyncio.shield(insert)
+        except asyncio.CancelledError:
+            # Поток не прервать: соединение можно закрывать только после его завершения
+            await asyncio.gather(insert, return_exceptions=True)
+            raise
+        for link, final_filename in batch:
+            if link in inserted:
+                stats['new_links'] += 1
+                log_message(f"Добавлен документ: {final_filename}", "SUCCESS")
+            else:
+                stats['existing_links'] += 1
+        batch.clear()
+
+    while True:
+        item = await results.get()
+        if item is _DONE:
+            break
+        batch.append(item)
+        # Пишем полную пачку или то, что накопилось, пока очередь пуста
+        if len(batch) >= DB_BATCH_SIZE or results.empty():
+            await flush()
+    if batch:
+        await flush()
+
+
+# ================== ОБРАБОТКА ==================
+
+async def process_json_file(file_path, client, force_download=False):
+    """Обработка JSON файла с возможностью принудительного скачивания"""
+    stats = {
+        'total': 0,
+        'valid_json': 0,
+        'matching_category': 0,
+        'has_attachments': 0,
+        'valid_links': 0,
+        'new_links': 0,
+        'existing_links': 0
+    }
+    downloader = Downloader(client)
+    downloads = asyncio.Queue(maxsize=MAX_CONCURRENCY * 2)
+    results = asyncio.Queue()
+
+    async def fetch_worker():
+        while True:
+            item = await downloads.get()
+            if item is _DONE:
+                return
+            link, attachment_name = item
+            final_filename = await downloader.download(link, attachment_name)
+            if final_filename is not None:
+                await results.put((link, final_filename))
+
+    lookup_conn = writer_conn = None
+    workers = []
+    writer = None
+    try:
+        lookup_conn = psycopg2.connect(**DB_CONFIG)
+        lookup_conn.autocommit = True
+        writer_conn = psycopg2.connect(**DB_CONFIG)
+        lookup_cursor = lookup_conn.cursor()
+
+        workers = [asyncio.create_task(fetch_worker()) for _ in range(MAX_CONCURRENCY)]
+        writer = asyncio.create_task(db_writer(writer_conn, results, stats))
+
+        async def enqueue_new(chunk):
+            """Отправляет на скачивание только ссылки, которых нет в базе"""
+            try:
+                known = set() if force_download else await asyncio.to_thread(existing_urls, lookup_cursor, chunk)
+            except Exception as e:
+                log_message(f"Ошибка проверки {len(chunk)} ссылок: {str(e)}", "ERROR")
+                return
+            stats['existing_links'] += len(known)
+            for link, attachment_name in chunk.items():
+                if link not in known:
+                    await downloads.put((link, attachment_name))
+
+        seen = set()  # Ссылки этого файла, уже взятые в работу (повторы в выгрузке не проверяем и не качаем)
+        chunk = {}  # Ссылка -> имя вложения
+        # aclosing: при ошибке генератор закрывается сразу (дожидается потока разбора и закрывает файл)
+        async with contextlib.aclosing(iter_link_batches(file_path, stats)) as batches:
+            async for batch in batches:
+                if writer.done():
+                    writer.result()  # Писатель упал - дальше качать бессмысленно, пробрасываем его ошибку
+                for link, attachment_name in batch:
+                    if link in seen:
+                        stats['existing_links'] += 1
                         continue
-                    stats['valid_links'] += 1
-
-                    try:
-                        cursor.execute("SELECT 1 FROM saved_court_decisions WHERE url = %s LIMIT 1", (link,))
-                        if force_download or cursor.fetchone() is None:
-                            attachment_name = attachment.get('displayName', '')
-                            filename = get_filename_from_url(link, attachment_name)
-                            safe_filename = re.sub(r'[\\/*?:"<>|]', '_', filename)
-                            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                            final_filename = f"{timestamp}_{safe_filename}"
-                            save_path = os.path.join(DOWNLOAD_DIR, final_filename)
-
-                            if download_file(link, save_path):
-                                cursor.execute(
-                                    """INSERT INTO saved_court_decisions 
-                                    (source_id, download_date, url, original_file_name, txt_file_name, created_at, updated_at) 
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                                    ON CONFLICT (url) DO NOTHING""",
-                                    (1, datetime.now(), link, final_filename,
-                                     f"{final_filename}.txt", datetime.now(), datetime.now())
-                                )
-                                if cursor.rowcount > 0:
-                                    stats['new_links'] += 1
-                                    log_message(f"Добавлен документ: {final_filename}", "SUCCESS")
-                                else:
-                                    stats['existing_links'] += 1
-                        else:
-                            stats['existing_links'] += 1
-                    except Exception as e:
-                        log_message(f"Ошибка обработки ссылки {link}: {str(e)}", "ERROR")
-
-                if stats['new_links'] % 10 == 0:
-                    conn.commit()
-
-        conn.commit()
+                    seen.add(link)
+                    chunk[link] = attachment_name
+                    if len(chunk) >= URL_CHECK_CHUNK:
+                        await enqueue_new(chunk)
+                        chunk = {}
+        if chunk:
+            await enqueue_new(chunk)
+
+        for _ in workers:
+            await downloads.put(_DONE)
+        await asyncio.gather(*workers)
+        await results.put(_DONE)
+        await writer
 
         log_message(f"""
 Итоговая статистика:
@@ -169,12 +341,28 @@ def process_json_file(file_path, force_download=False):
 
     except Exception as e:
         log_message(f"Критическая ошибка: {str(e)}", "ERROR")
-        if 'conn' in locals():
-            conn.rollback()
         return 0
     finally:
-        if 'conn' in locals():
-            conn.close()
+        tasks = workers + ([writer] if writer is not None else [])
+        for task in tasks:
+            task.cancel()
+        # Соединения закрываются только после остановки задач (close откатывает незавершённую транзакцию)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for conn in (lookup_conn, writer_conn):
+            if conn is not None:
+                conn.close()
+
+
+async def run(json_files):
+    total_links = 0
+    async with create_client() as client:
+        for file_path in json_files:
+            log_message(f"Обработка файла: {file_path}", "INFO")
+            links_added = await process_json_file(file_path, client,
+                                                  force_download=False)  # Измените на True для принудительного скачивания
+            total_links += links_added
+            log_message(f"Добавлено ссылок: {links_added}", "INFO")
+    return total_links
 
 
 def main():
@@ -186,18 +374,12 @@ def main():
         log_message("Нет JSON файлов для обработки", "WARNING")
         return
 
-    log_message(f"Начало обработки {len(json_files)} файлов", "INFO")
+    log_message(f"Начало обработки {len(json_files)} файлов (HTTP/2: {'да' if h2 is not None else 'нет'})", "INFO")
 
-    total_links = 0
-    for file_path in json_files:
-        log_message(f"Обработка файла: {file_path}", "INFO")
-        links_added = process_json_file(file_path,
-                                        force_download=False)  # Измените на True для принудительного скачивания
-        total_links += links_added
-        log_message(f"Добавлено ссылок: {links_added}", "INFO")
+    total_links = asyncio.run(run(json_files))
 
     log_message(f"Обработка завершена. Всего добавлено ссылок: {total_links}", "INFO")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,9 @@
-import os
-import shutil
 from tqdm import tqdm
 from pathlib import Path
 from collections import defaultdict
 from datetime import datetime
+from file_index import get_file_index, indexed_files
+from move_planner import MovePlan, execute_plan
 
 # ================== КОНФИГУРАЦИЯ ==================
 PROCESSED_DIR = Path("data/processed_files")  # Папка с исходными файлами
@@ -12,6 +12,7 @@ LOG_FILE = Path("logs") / f"clean_duplicates_{datetime.now().strftime('%Y%m%d_%H
 
 # Корректные расширения (должны быть в нижнем регистре)
 VALID_EXTENSIONS = {'.doc', '.docx', '.rtf'}
+USE_FILE_INDEX = True  # Брать список файлов из общего индекса (data/file_index.sqlite)
 
 
 # ================== ОСНОВНЫЕ ФУНКЦИИ ==================
@@ -21,13 +22,20 @@ def get_file_key(filepath):
     return filepath.stem.lower()  # Имя файла без расширения в нижнем регистре
 
 
+def list_processed_files():
+    """Файлы PROCESSED_DIR: из общего индекса (перечитываются только изменившиеся) или обходом папки"""
+    if USE_FILE_INDEX:
+        return [indexed.path for indexed in indexed_files(PROCESSED_DIR)]
+    return [filepath for filepath in PROCESSED_DIR.glob('*') if filepath.is_file()]
+
+
 def find_duplicate_files():
     """Находит файлы с одинаковыми именами, но разными расширениями"""
     files_by_key = defaultdict(list)
 
     # Собираем все файлы, группируя по ключу (имя без расширения)
-    for filepath in PROCESSED_DIR.glob('*.*'):
-        if filepath.is_file():
+    for filepath in list_processed_files():
+        if '.' in filepath.name:
             key = get_file_key(filepath)
             files_by_key[key].append(filepath)
 
@@ -44,19 +52,17 @@ def select_valid_file(files):
     return None  # Если нет файлов с правильным расширением
 
 
-def move_bad_files(valid_file, bad_files):
-    """Перемещает файлы с некорректными расширениями"""
-    BAD_EXT_DIR.mkdir(parents=True, exist_ok=True)
-
-    moved_files = []
+def plan_bad_files(plan, valid_file, bad_files):
+    """Добавляет в план перемещение файлов с некорректными расширениями"""
+    planned = []
     for filepath in bad_files:
         # Перемещаем только файлы с некорректными расширениями
         if filepath != valid_file and filepath.suffix.lower() not in VALID_EXTENSIONS:
-            target = BAD_EXT_DIR / filepath.name
-            shutil.move(str(filepath), str(target))
-            moved_files.append((filepath.name, target))
+            # Имя в BAD_EXT_DIR подбирается с учетом диска и уже запланированных перемещений
+            target = plan.free_name(BAD_EXT_DIR, filepath.name)
+            planned.append(plan.add(filepath, target))
 
-    return moved_files
+    return planned
 
 
 def process_duplicates():
@@ -68,6 +74,18 @@ def process_duplicates():
 
     print(f"Найдено {len(duplicates)} групп дубликатов.")
 
+    # Сначала план перемещений по всем группам, затем выполнение пулом потоков
+    plan = MovePlan()
+    groups = []
+    for key, files in duplicates.items():
+        valid_file = select_valid_file(files)
+        if valid_file:
+            groups.append((key, valid_file, plan_bad_files(plan, valid_file, files)))
+
+    BAD_EXT_DIR.mkdir(parents=True, exist_ok=True)
+    with tqdm(total=len(plan), desc="Перемещение файлов") as progress:
+        errors = dict(execute_plan(plan, progress=progress))
+
     # Создаем папку для логов
     LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
 
@@ -78,23 +96,29 @@ def process_duplicates():
         log.write("=" * 50 + "\n")
 
         total_moved = 0
-
-        for key, files in tqdm(duplicates.items(), desc="Обработка дубликатов"):
-            valid_file = select_valid_file(files)
-            if valid_file:
-                bad_files = files  # Теперь передаем все файлы, фильтрация происходит в move_bad_files
-                moved = move_bad_files(valid_file, files)
-
-                log.write(f"Группа: {key}\n")
-                log.write(f"Оставлен файл: {valid_file.name}\n")
-                for orig, target in moved:
-                    log.write(f"Перемещен: {orig} -> {target}\n")
-                log.write("-" * 50 + "\n")
-
-                total_moved += len(moved)
-
+        lines = []
+
+        for key, valid_file, moves in groups:
+            lines.append(f"Группа: {key}\n")
+            lines.append(f"Оставлен файл: {valid_file.name}\n")
+            for move in moves:
+                error = errors[move]
+                if error is None:
+                    lines.append(f"Перемещен: {move.src.name} -> {move.dst}\n")
+                    if USE_FILE_INDEX:
+                        get_file_index().moved(move.src, move.dst)
+                    total_moved += 1
+                else:
+                    lines.append(f"Ошибка перемещения: {move.src.name} -> {move.dst}: {error}\n")
+            lines.append("-" * 50 + "\n")
+
+        # Лог пишется одним блоком, а не строкой на каждый файл
+        log.writelines(lines)
         log.write(f"\nИтого: перемещено {total_moved} файлов\n")
 
+    if USE_FILE_INDEX:
+        get_file_index().commit()
+
     print(f"Готово! Перемещено {total_moved} файлов. Лог сохранен в {LOG_FILE}")
 
 
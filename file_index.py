@@ -0,0 +1,239 @@
+import os
+import time
+import sqlite3
+from pathlib import Path
+from collections import namedtuple
+from conversion_cache import compute_file_hash
+from file_signature import sniff_file_type
+
+# ================== КОНФИГУРАЦИЯ ==================
+INDEX_FILE = Path("data/file_index.sqlite")  # Общий индекс файлов для служебных скриптов
+
+# Запись индекса; md5, ftype и real_ext считаются лениво и равны None, пока не запрошены
+IndexedFile = namedtuple("IndexedFile", "path name size mtime_ns inode md5 ftype real_ext")
+
+_COLUMNS = "path, name, size, mtime_ns, inode, md5, ftype, real_ext"
+_index = None  # Общий индекс процесса (get_file_index)
+
+
+def _dir_key(directory):
+    # На Windows имена регистронезависимы: ключ папки в нижнем регистре, путь - как на диске
+    return os.path.normcase(str(directory))
+
+
+def _file_key(path):
+    path = Path(path)
+    return _dir_key(path.parent), path.name
+
+
+def _row_to_file(row):
+    return IndexedFile(Path(row[0]), *row[1:])
+
+
+class FileIndex:
+    """Инкрементальный индекс файлов (путь, размер, mtime, inode, MD5, тип по сигнатуре,
+    расширение по реальному типу).
+
+    refresh() обходит папку через os.scandir и обновляет только записи, у которых
+    изменились размер, mtime или inode; у изменённых сбрасываются MD5 и тип.
+    Хеш и тип считаются при первом запросе и сохраняются, поэтому повторный проход
+    по архиву читает только новые и изменённые файлы.
+    """
+
+    def __init__(self, db_path=INDEX_FILE):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True, parents=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                dir TEXT NOT NULL,
+                name TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                md5 TEXT,
+                ftype TEXT,
+                real_ext TEXT,
+                indexed_at REAL NOT NULL,
+                PRIMARY KEY (dir, name)
+            )
+        """)
+        # Индекс, созданный до появления колонки real_ext
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        if "real_ext" not in columns:
+            self.conn.execute("ALTER TABLE files ADD COLUMN real_ext TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_md5 ON files (md5)")
+        self.conn.commit()
+
+    # ---------- обновление ----------
+
+    def _refresh_dir(self, dir_path, entries):
+        dir_key = _dir_key(dir_path)
+        known = {
+            name: (size, mtime_ns, inode)
+            for name, size, mtime_ns, inode in self.conn.execute(
+                "SELECT name, size, mtime_ns, inode FROM files WHERE dir = ?", (dir_key,))
+        }
+        now = time.time()
+        upserts = []
+        for entry in entries:
+            try:
+                st = entry.stat()
+                signature = (st.st_size, st.st_mtime_ns, entry.inode())
+            except OSError:
+                continue
+            if known.pop(entry.name, None) != signature:
+                upserts.append((dir_key, entry.name, os.path.join(dir_path, entry.name), *signature, now))
+
+        self.conn.executemany("""
+            INSERT INTO files (dir, name, path, size, mtime_ns, inode, md5, ftype, indexed_at)
+            VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, ?)
+            ON CONFLICT (dir, name) DO UPDATE SET
+                path = excluded.path, size = excluded.size, mtime_ns = excluded.mtime_ns,
+                inode = excluded.inode, md5 = NULL, ftype = NULL, real_ext = NULL,
+                indexed_at = excluded.indexed_at
+        """, upserts)
+        # Оставшиеся в known файлы из папки пропали
+        self.conn.executemany("DELETE FROM files WHERE dir = ? AND name = ?",
+                              [(dir_key, name) for name in known])
+        return len(upserts), len(known)
+
+    def refresh(self, directory, recursive=False):
+        """Приводит индекс папки в соответствие с диском. Возвращает (изменено/добавлено, удалено)"""
+        root = str(Path(directory).resolve())
+        root_key = _dir_key(root)
+        changed = removed = 0
+        visited = set()
+        pending = [root]
+        while pending:
+            dir_path = pending.pop()
+            visited.add(_dir_key(dir_path))
+            files = []
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_file():
+                                files.append(entry)
+                            elif recursive and entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                        except OSError:
+                            continue
+            except FileNotFoundError:
+                pass
+            c, r = self._refresh_dir(dir_path, files)
+            changed += c
+            removed += r
+            self.conn.commit()
+
+        # Подпапки, которых больше нет
+        stale = [d for (d,) in self.conn.execute(
+            "SELECT DISTINCT dir FROM files WHERE dir >= ? AND dir < ?", self._subdir_range(root_key))
+            if d not in visited] if recursive else []
+        for dir_key in stale:
+            removed += self.conn.execute("DELETE FROM files WHERE dir = ?", (dir_key,)).rowcount
+        self.conn.commit()
+        return changed, removed
+
+    @staticmethod
+    def _subdir_range(dir_key):
+        # Все пути, начинающиеся с "dir_key/", без LIKE (в именах бывают % и _)
+        prefix = dir_key.rstrip(os.sep) + os.sep
+        return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+    # ---------- запросы ----------
+
+    def files(self, directory, recursive=False, extensions=None):
+        """Записи файлов папки (с подпапками при recursive), при необходимости по расширениям"""
+        dir_key = _dir_key(Path(directory).resolve())
+        if recursive:
+            low, high = self._subdir_range(dir_key)
+            rows = self.conn.execute(
+                f"SELECT {_COLUMNS} FROM files WHERE dir = ? OR (dir >= ? AND dir < ?)",
+                (dir_key, low, high))
+        else:
+            rows = self.conn.execute(f"SELECT {_COLUMNS} FROM files WHERE dir = ?", (dir_key,))
+
+        if extensions:
+            extensions = tuple(ext.lower() for ext in extensions)
+            return [_row_to_file(row) for row in rows if row[1].lower().endswith(extensions)]
+        return [_row_to_file(row) for row in rows]
+
+    def directories(self, directory):
+        """Папки с файлами внутри directory (включая её саму), пути - как на диске"""
+        dir_key = _dir_key(Path(directory).resolve())
+        low, high = self._subdir_range(dir_key)
+        rows = self.conn.execute(
+            "SELECT MIN(path) FROM files WHERE dir = ? OR (dir >= ? AND dir < ?) GROUP BY dir",
+            (dir_key, low, high))
+        return [Path(path).parent for (path,) in rows]
+
+    def set_md5(self, path, md5):
+        """Сохраняет уже посчитанный хеш файла (path - абсолютный, как в записях индекса)"""
+        self.conn.execute("UPDATE files SET md5 = ? WHERE dir = ? AND name = ?", (md5, *_file_key(path)))
+
+    def set_type(self, path, ftype):
+        """Сохраняет уже определённый тип файла (path - абсолютный, как в записях индекса)"""
+        self.conn.execute("UPDATE files SET ftype = ? WHERE dir = ? AND name = ?", (ftype, *_file_key(path)))
+
+    def set_real_ext(self, path, real_ext):
+        """Сохраняет расширение по реальному типу файла ("" - тип не определён)"""
+        self.conn.execute("UPDATE files SET real_ext = ? WHERE dir = ? AND name = ?",
+                          (real_ext, *_file_key(path)))
+
+    def get_md5(self, indexed_file):
+        """MD5 файла: из индекса или (один раз) потоковым чтением"""
+        if indexed_file.md5:
+            return indexed_file.md5
+        md5 = compute_file_hash(indexed_file.path)
+        self.set_md5(indexed_file.path, md5)
+        return md5
+
+    def get_type(self, indexed_file, sniff=sniff_file_type):
+        """Тип файла: из индекса или (один раз) через sniff"""
+        if indexed_file.ftype:
+            return indexed_file.ftype
+        ftype = sniff(indexed_file.path)
+        if ftype:
+            self.set_type(indexed_file.path, ftype)
+        return ftype
+
+    # ---------- изменения, сделанные скриптами ----------
+
+    def moved(self, src, dst):
+        """Файл переименован/перемещён скриптом: переносим запись вместе с хешем и типом"""
+        src = Path(src).resolve()
+        dst = Path(dst).resolve()
+        dst_key = _file_key(dst)
+        self.conn.execute("DELETE FROM files WHERE dir = ? AND name = ?", dst_key)
+        self.conn.execute(
+            "UPDATE files SET dir = ?, name = ?, path = ? WHERE dir = ? AND name = ?",
+            (*dst_key, str(dst), *_file_key(src)))
+
+    def forget(self, path):
+        self.conn.execute("DELETE FROM files WHERE dir = ? AND name = ?", _file_key(Path(path).resolve()))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def get_file_index():
+    """Общий индекс (открывается один раз на процесс)"""
+    global _index
+    if _index is None:
+        _index = FileIndex()
+    return _index
+
+
+def indexed_files(directory, recursive=False, extensions=None):
+    """Обновляет индекс папки (только изменившиеся записи) и возвращает её файлы"""
+    index = get_file_index()
+    index.refresh(directory, recursive)
+    return index.files(directory, recursive, extensions)
@@ -0,0 +1,42 @@
+import zipfile
+
+# ================== КОНФИГУРАЦИЯ ==================
+OLE_SIGNATURE = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'  # DOC (OLE2 Compound File)
+ZIP_SIGNATURE = b'PK\x03\x04'  # DOCX и любой другой ZIP
+RTF_SIGNATURE = b'{\\rtf'
+HEADER_SIZE = 8  # Сколько байт нужно для проверки сигнатур
+DOCX_MAIN_PART = 'word/document.xml'
+
+
+def sniff_stream(f):
+    """Определяет формат открытого бинарного файла ТОЛЬКО по сигнатуре, без учёта расширения.
+
+    Возвращает (формат, ZipFile): формат - "doc", "docx", "rtf", "zip" или "unknown";
+    для ZIP-архивов вторым элементом отдается уже открытый ZipFile (каталог архива
+    прочитан, его можно переиспользовать), иначе None.
+    """
+    header = f.read(HEADER_SIZE)
+
+    if header.startswith(OLE_SIGNATURE):
+        return "doc", None
+    if header.startswith(RTF_SIGNATURE):
+        return "rtf", None
+    if header.startswith(ZIP_SIGNATURE):
+        try:
+            zip_ref = zipfile.ZipFile(f)
+        except zipfile.BadZipFile:
+            return "unknown", None
+        # Проверяем, содержит ли архив правильную структуру DOCX
+        if any(DOCX_MAIN_PART in name for name in zip_ref.namelist()):
+            return "docx", zip_ref
+        return "zip", zip_ref
+    return "unknown", None
+
+
+def sniff_file_type(path):
+    """Формат файла по сигнатуре (читается заголовок и, для ZIP, только каталог архива)"""
+    with open(path, 'rb') as f:
+        file_format, zip_ref = sniff_stream(f)
+        if zip_ref is not None:
+            zip_ref.close()
+    return file_format
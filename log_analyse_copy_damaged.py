@@ -1,20 +1,27 @@
 import re
 import shutil
 from pathlib import Path
+from conversion_events import EVENTS_FILE, open_events_db, failed_files
 
 # Конфигурация
 PROCESSED_DIR = Path("data/processed_files")
 DAMAGED_DIR = PROCESSED_DIR / "damaged"
 LOG_FILE = Path("logs/conv.log")
+USE_EVENT_STORE = True  # Брать ошибки из data/conversion_events.sqlite; без базы - разбор LOG_FILE
+DAMAGED_EXTENSIONS = ('.doc', '.docx')
 
 
-def process_damaged_files():
-    """Обработка поврежденных файлов из лога"""
+def find_damaged_in_events():
+    """Файлы с ошибками конвертации из хранилища событий (запрос по индексу статуса)"""
+    conn = open_events_db(EVENTS_FILE)
+    try:
+        return set(failed_files(conn, DAMAGED_EXTENSIONS))
+    finally:
+        conn.close()
 
-    # Создаем папку для поврежденных файлов
-    DAMAGED_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Читаем лог и ищем ошибки
+def find_damaged_in_log():
+    """Файлы с ошибками конвертации из текстового лога старого формата"""
     damaged_files = set()
     pattern = re.compile(r'Ошибка конвертации (.*?\.docx?):')
 
@@ -23,6 +30,20 @@ def process_damaged_files():
             match = pattern.search(line)
             if match:
                 damaged_files.add(match.group(1))
+    return damaged_files
+
+
+def process_damaged_files():
+    """Обработка поврежденных файлов из лога"""
+
+    # Создаем папку для поврежденных файлов
+    DAMAGED_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Ищем ошибки: в хранилище событий, а если его нет - в логе
+    if USE_EVENT_STORE and EVENTS_FILE.exists():
+        damaged_files = find_damaged_in_events()
+    else:
+        damaged_files = find_damaged_in_log()
 
     print(f"Найдено {len(damaged_files)} поврежденных файлов")
 
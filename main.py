@@ -1,12 +1,28 @@
+import io
 import os
 import time
 import shutil
 import subprocess
 import hashlib
+import argparse
+import zipfile
+from collections import deque
+from itertools import chain, islice
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from tqdm import tqdm
 from docx import Document
+from rtf_text import convert_rtf_file
+from docx_text import DOCUMENT_PART, iter_paragraphs, write_paragraphs
+from conversion_cache import ConversionCache, compute_file_hash
+from dir_watch import DirectoryWatcher, watch_directory
+from source_scan import SourceScan
+from conversion_journal import (ProcessLock, LockHeld, ConversionJournal, STATE_QUEUED, STATE_CONVERTING,
+                                STATE_CONVERTED, STATE_MOVED, STATE_FAILED)
+from conversion_events import EventStore, make_event, STATUS_SUCCESS, STATUS_ERROR
+from text_normalize import normalize_file, output_path, output_tag
 
 # ================== КОНФИГУРАЦИЯ ==================
 SOURCE_DIR = Path("data/test")  # Папка с исходными файлами
@@ -14,6 +30,27 @@ TXT_DIR = Path("data/test_txt")  # Папка для текстовых файл
 PROCESSED_DIR = Path("data/processed_files")  # Папка для обработанных файлов
 LOG_FILE = Path(f"logs/conversion_log_{int(time.time())}.csv")  # Лог-файл с timestamp
 LOCK_FILE = Path("processing.lock")  # Файл блокировки
+SCAN_STATE_FILE = Path("data/main_scan.json")  # Число файлов прошлого прохода
+JOURNAL_FILE = Path("data/main_journal.log")  # Журнал состояний файлов для продолжения после падения
+DOC_TIMEOUT = 60  # Таймаут конвертации одного DOC-файла (секунды)
+DOC_STDERR_CHARS = 300  # Сколько символов stderr antiword/catdoc сохранять в логе ошибки
+USE_CACHE = True  # Не конвертировать повторно файлы с уже известным содержимым
+CONVERTER_VERSION = "main-2"  # Менять при изменении логики конвертации (сбрасывает кэш)
+MAX_IN_FLIGHT_PER_WORKER = 4  # Сколько задач держим в очереди на один процесс пула
+LOG_FLUSH_ROWS = 500  # Сбрасывать лог на диск каждые N строк...
+LOG_FLUSH_INTERVAL = 5  # ...или раз в N секунд
+COPY_CHUNK_SIZE = 1024 * 1024  # Размер блока при копировании во временный файл
+DOCX_IN_MEMORY_BYTES = 64 * 1024 * 1024  # DOCX не больше этого читается с диска один раз: хеш и конвертация из памяти
+USE_EVENT_STORE = True  # Дублировать лог событиями в data/conversion_events.sqlite (запросы: conversion_events.py)
+NORMALIZE_TEXT = True  # Нормализовать TXT после конвертации: пробелы, шаблонные строки, сжатие (text_normalize.py)
+
+# В процессе пула строки лога (вместе с событиями) копятся здесь и пишутся основным процессом
+_log_buffer = None
+_cache = None  # Кэш конвертаций, открывается лениво в каждом процессе
+_log_writer = None  # Буферизованный писатель лога (только в основном процессе)
+_known_hashes = {}  # Хеши текущего файла, посчитанные при копировании: путь -> MD5
+_lock = ProcessLock(LOCK_FILE)
+_journal = None  # Журнал состояний, открывается лениво в каждом процессе
 
 
 # ================== ОСНОВНЫЕ ФУНКЦИИ ==================
@@ -25,86 +62,205 @@ def setup_environment():
         for folder in [SOURCE_DIR, TXT_DIR, PROCESSED_DIR]:
             folder.mkdir(exist_ok=True, parents=True)
 
-        # Удаляем старый lock-файл
-        if LOCK_FILE.exists():
-            LOCK_FILE.unlink()
-
-        # Создаем новый lock-файл
-        with open(LOCK_FILE, 'w') as f:
-            f.write(str(os.getpid()))
+        # Блокировка снимается сама, если процесс упал, поэтому старый lock-файл не удаляем
+        _lock.acquire()
 
         # Инициализация лог-файла
         with open(LOG_FILE, 'w', encoding='utf-8') as f:
             f.write("timestamp,human_time,operation,filename,details,filehash\n")
 
         return True
+    except LockHeld as e:
+        print(f"⛔ {e}")
+        return False
     except Exception as e:
         print(f"⛔ Ошибка инициализации: {e}")
         return False
 
 
+class LogWriter:
+    """Буферизованная запись строк лога (и событий в EventStore) с периодическим сбросом на диск"""
+
+    def __init__(self, path, events=None, flush_rows=LOG_FLUSH_ROWS, flush_interval=LOG_FLUSH_INTERVAL):
+        self.path = path
+        self.events = events
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.pending_events = []
+        self.file = None
+        self.last_flush = time.monotonic()
+
+    def write(self, entries):
+        """entries - пары (строка CSV, событие make_event)"""
+        for row, event in entries:
+            self.rows.append(row)
+            self.pending_events.append(event)
+        if len(self.rows) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.writelines(self.rows)
+            self.file.flush()
+            self.rows.clear()
+        if self.pending_events:
+            if self.events is not None:
+                self.events.record_many(self.pending_events)
+                self.events.flush()
+            self.pending_events.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.events is not None:
+            self.events.close()
+
+
+def get_log_writer():
+    """Возвращает писатель лога основного процесса"""
+    global _log_writer
+    if _log_writer is None:
+        _log_writer = LogWriter(LOG_FILE, EventStore("main") if USE_EVENT_STORE else None)
+    return _log_writer
+
+
+def copy_with_hash(src_file, dst_file):
+    """Копирует файл и считает его MD5 за один проход чтения"""
+    h = hashlib.md5()
+    with open(src_file, 'rb') as src, open(dst_file, 'wb') as dst:
+        for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+            h.update(chunk)
+            dst.write(chunk)
+    shutil.copystat(src_file, dst_file)
+    return h.hexdigest()
+
+
+def read_with_hash(filepath):
+    """Читает файл в память и считает его MD5 по тем же байтам"""
+    data = Path(filepath).read_bytes()
+    return data, hashlib.md5(data).hexdigest()
+
+
 def get_file_hash(filepath):
-    """Вычисляет MD5 хеш файла"""
+    """Вычисляет MD5 хеш файла (берет уже посчитанный при копировании, если есть)"""
+    filehash = _known_hashes.get(str(filepath))
+    if filehash:
+        return filehash
     try:
-        with open(filepath, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+        return compute_file_hash(filepath)
     except:
         return "error"
 
 
-def log_error(filename, message, filepath=None):
-    """Логирование ошибок с хешем файла"""
+def write_log_rows(entries):
+    """Дописывает пары (строка, событие) в лог (в процессе пула - в буфер для основного процесса)"""
+    if _log_buffer is not None:
+        _log_buffer.extend(entries)
+        return
+    if entries:
+        get_log_writer().write(entries)
+
+
+def log_error(filename, message, filepath=None, error=None):
+    """Логирование ошибок с хешем файла; error - исключение (для класса ошибки в событии)"""
     timestamp, human_time = time.time(), datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     filehash = get_file_hash(filepath) if filepath else "none"
-    with open(LOG_FILE, 'a', encoding='utf-8') as f:
-        f.write(f"{timestamp},{human_time},ERROR,{filename},{message},{filehash}\n")
+    event = make_event("ERROR", STATUS_ERROR, filename, error=message,
+                       error_class=type(error).__name__ if error is not None else None, filehash=filehash)
+    write_log_rows([(f"{timestamp},{human_time},ERROR,{filename},{message},{filehash}\n", event)])
 
 
 def log_success(operation, filename, details="", filepath=None):
     """Логирование успешных операций"""
     timestamp, human_time = time.time(), datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     filehash = get_file_hash(filepath) if filepath else "none"
-    with open(LOG_FILE, 'a', encoding='utf-8') as f:
-        f.write(f"{timestamp},{human_time},{operation},{filename},{details},{filehash}\n")
+    event = make_event(operation, STATUS_SUCCESS, filename, filehash=filehash)
+    write_log_rows([(f"{timestamp},{human_time},{operation},{filename},{details},{filehash}\n", event)])
 
 
 # ================== КОНВЕРТАЦИЯ ФАЙЛОВ ==================
 
-def convert_docx(src_file, txt_file):
-    """Конвертация DOCX в TXT"""
+def convert_docx(src_file, txt_file, source_name=None, data=None):
+    """Конвертация DOCX в TXT; data - уже прочитанное содержимое src_file (тогда диск не читается)"""
+    source_name = source_name or src_file.name
+
+    def open_source():
+        return io.BytesIO(data) if data is not None else src_file
+
+    # Быстрый путь: потоково читаем word/document.xml прямо из архива
+    try:
+        with zipfile.ZipFile(open_source()) as zip_ref, zip_ref.open(DOCUMENT_PART) as xml_file:
+            with open(txt_file, 'w', encoding='utf-8') as f:
+                write_paragraphs(iter_paragraphs(xml_file), f)
+        return True
+    except Exception as e:
+        # Ещё не ошибка: в лог попадет только вместе с отказом запасного пути
+        stream_error = e
+
+    # Запасной путь через python-docx
     try:
-        doc = Document(src_file)
+        doc = Document(open_source())
         text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
         with open(txt_file, 'w', encoding='utf-8') as f:
             f.write(text)
+        log_success("DOCX_CONVERT", source_name, "used python-docx", src_file)
         return True
     except Exception as e:
-        log_error(src_file.name, f"DOCX error: {str(e)}", src_file)
+        log_error(source_name, f"DOCX error: {str(e)} (stream: {str(stream_error)})", src_file, e)
         return False
 
 
-def convert_doc_linux(src_file, txt_file):
+@lru_cache(maxsize=None)
+def find_doc_tools():
+    """Находит antiword/catdoc один раз за запуск (полные пути)"""
+    return tuple(path for path in (shutil.which(cmd) for cmd in ('antiword', 'catdoc')) if path)
+
+
+def convert_doc_linux(src_file, txt_file, source_name=None):
     """Конвертация DOC в TXT для Linux/Mac"""
+    source_name = source_name or src_file.name
     try:
-        # Пробуем antiword или catdoc
-        for cmd in ['antiword', 'catdoc']:
-            if shutil.which(cmd):
-                result = subprocess.run([cmd, str(src_file)],
+        # Пробуем antiword или catdoc; в лог - только итоговый отказ всех утилит
+        failures = []
+        for tool in find_doc_tools():
+            tool_name = os.path.basename(tool)
+            try:
+                # По таймауту subprocess.run убивает только зависший дочерний процесс
+                result = subprocess.run([tool, str(src_file)],
+                                        stdin=subprocess.DEVNULL,
                                         stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE,
                                         encoding='utf-8',
-                                        errors='ignore')
-                if result.returncode == 0:
-                    with open(txt_file, 'w', encoding='utf-8') as f:
-                        f.write(result.stdout)
-                    return True
+                                        errors='ignore',
+                                        timeout=DOC_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                failures.append(f"{tool_name}: timeout > {DOC_TIMEOUT}s")
+                continue
+            if result.returncode == 0:
+                with open(txt_file, 'w', encoding='utf-8') as f:
+                    f.write(result.stdout)
+                return True
+            # Строка лога - CSV: stderr в одну строку и без запятых
+            stderr = " ".join(result.stderr.split()).replace(",", ";")[:DOC_STDERR_CHARS]
+            failures.append(f"{tool_name}: exit {result.returncode}: {stderr}")
+        if not failures:
+            failures.append("antiword/catdoc не найдены")
+        log_error(source_name, f"DOC linux error: {' | '.join(failures)}", src_file)
         return False
     except Exception as e:
-        log_error(src_file.name, f"DOC linux error: {str(e)}", src_file)
+        log_error(source_name, f"DOC linux error: {str(e)}", src_file, e)
         return False
 
 
-def convert_doc_windows(src_file, txt_file):
+def convert_doc_windows(src_file, txt_file, source_name=None):
     """Конвертация DOC в TXT для Windows"""
+    source_name = source_name or src_file.name
     try:
         import win32com.client
         word = win32com.client.Dispatch("Word.Application")
@@ -115,13 +271,22 @@ def convert_doc_windows(src_file, txt_file):
         word.Quit()
         return True
     except Exception as e:
-        log_error(src_file.name, f"DOC Windows error: {str(e)}", src_file)
+        log_error(source_name, f"DOC Windows error: {str(e)}", src_file, e)
         return False
 
 
-def convert_rtf(src_file, txt_file):
+def convert_rtf(src_file, txt_file, source_name=None):
     """Конвертация RTF в TXT"""
+    source_name = source_name or src_file.name
     try:
+        # Встроенный потоковый декодер (cp1251 через \'xx, \uN, без картинок в памяти)
+        try:
+            convert_rtf_file(src_file, txt_file)
+            log_success("RTF_CONVERT", source_name, "used rtf_text", src_file)
+            return True
+        except Exception as e:
+            log_error(source_name, f"rtf_text error: {str(e)}", src_file, e)
+
         # Пробуем striprtf (кросс-платформенный)
         try:
             from striprtf.striprtf import rtf_to_text
@@ -129,7 +294,7 @@ def convert_rtf(src_file, txt_file):
                 text = rtf_to_text(f.read())
             with open(txt_file, 'w', encoding='utf-8') as f:
                 f.write(text)
-            log_success("RTF_CONVERT", src_file.name, "used striprtf", src_file)
+            log_success("RTF_CONVERT", source_name, "used striprtf", src_file)
             return True
         except ImportError:
             pass
@@ -145,76 +310,126 @@ def convert_rtf(src_file, txt_file):
                     text = result.stdout.split('----------')[0]  # Очистка вывода
                     with open(txt_file, 'w', encoding='utf-8') as f:
                         f.write(text)
-                    log_success("RTF_CONVERT", src_file.name, "used unrtf", src_file)
+                    log_success("RTF_CONVERT", source_name, "used unrtf", src_file)
                     return True
             except Exception as e:
-                log_error(src_file.name, f"unrtf error: {str(e)}", src_file)
+                log_error(source_name, f"unrtf error: {str(e)}", src_file, e)
 
-        # Ручная очистка RTF (последний вариант)
-        try:
-            import re
-            with open(src_file, 'r', encoding='utf-8', errors='ignore') as f:
-                text = f.read()
-            clean_text = re.sub(r'\\[a-z]+[0-9]*|{[^}]+}|\\\'[0-9a-f]{2}', '', text)
-            clean_text = re.sub(r'\n{3,}', '\n\n', clean_text)
-            with open(txt_file, 'w', encoding='utf-8') as f:
-                f.write(clean_text)
-            log_success("RTF_CONVERT", src_file.name, "used manual cleanup", src_file)
-            return True
-        except Exception as e:
-            log_error(src_file.name, f"RTF manual error: {str(e)}", src_file)
-            return False
+        return False
 
     except Exception as e:
-        log_error(src_file.name, f"RTF conversion error: {str(e)}", src_file)
+        log_error(source_name, f"RTF conversion error: {str(e)}", src_file, e)
         return False
 
 
-def convert_to_txt(src_file, txt_file):
-    """Главная функция конвертации"""
+def convert_to_txt(src_file, txt_file, source_name=None, data=None):
+    """Главная функция конвертации; source_name - имя исходника для лога и событий
+    (src_file для DOC/RTF - временная копия temp_*), data - уже прочитанный DOCX"""
     ext = src_file.suffix.lower()
 
     if ext == '.docx':
-        return convert_docx(src_file, txt_file)
+        return convert_docx(src_file, txt_file, source_name, data)
     elif ext == '.doc':
         if os.name == 'nt':
-            return convert_doc_windows(src_file, txt_file)
+            return convert_doc_windows(src_file, txt_file, source_name)
         else:
-            return convert_doc_linux(src_file, txt_file)
+            return convert_doc_linux(src_file, txt_file, source_name)
     elif ext == '.rtf':
-        return convert_rtf(src_file, txt_file)
+        return convert_rtf(src_file, txt_file, source_name)
     else:
-        log_error(src_file.name, f"Unsupported format: {ext}", src_file)
+        log_error(source_name or src_file.name, f"Unsupported format: {ext}", src_file)
         return False
 
 
 # ================== ОБРАБОТКА ФАЙЛОВ ==================
 
+def get_cache():
+    """Открывает кэш конвертаций (один раз на процесс)"""
+    global _cache
+    if _cache is None:
+        _cache = ConversionCache()
+    return _cache
+
+
+def cache_version():
+    """Версия результата для кэша: конвертер и (если включена) нормализация"""
+    return f"{CONVERTER_VERSION}/{output_tag()}" if NORMALIZE_TEXT else CONVERTER_VERSION
+
+
+def final_txt_path(txt_file):
+    """Путь готового TXT после нормализации (при сжатии - .txt.zst)"""
+    return output_path(txt_file) if NORMALIZE_TEXT else txt_file
+
+
+def finish_txt(txt_file):
+    """Нормализует только что сконвертированный TXT. Возвращает итоговый путь"""
+    if not NORMALIZE_TEXT:
+        return txt_file
+    return normalize_file(txt_file)[0]
+
+
+def get_journal():
+    """Открывает журнал состояний для дописывания (в процессах пула - без проигрывания)"""
+    global _journal
+    if _journal is None:
+        _journal = ConversionJournal(JOURNAL_FILE, replay=False)
+    return _journal
+
+
 def process_file(filepath):
     """Обработка одного файла"""
     try:
         # Пропускаем системные файлы
         if filepath.suffix.lower() not in ('.doc', '.docx', '.rtf'):
             return False
+        get_journal().record(filepath.name, STATE_CONVERTING)
+
+        data = None
+        if filepath.suffix.lower() == '.docx':
+            # DOCX читается прямо из исходника, временная копия не нужна;
+            # файл обычного размера читается один раз - хеш и конвертация из памяти
+            src_file = filepath
+            if filepath.stat().st_size <= DOCX_IN_MEMORY_BYTES:
+                data, filehash = read_with_hash(filepath)
+            else:
+                filehash = compute_file_hash(filepath)
+        else:
+            # Создаем временную копию, попутно считая хеш для лога и кэша
+            temp_file = TXT_DIR / f"temp_{filepath.name}"
+            filehash = copy_with_hash(filepath, temp_file)
+            src_file = temp_file
+        _known_hashes[str(filepath)] = _known_hashes[str(src_file)] = filehash
 
-        # Создаем временную копию
-        temp_file = TXT_DIR / f"temp_{filepath.name}"
-        shutil.copy2(filepath, temp_file)
-
-        # Конвертируем
+        # Конвертируем (или берем готовый TXT из кэша по хешу содержимого)
         txt_file = TXT_DIR / f"{filepath.stem}.txt"
-        if convert_to_txt(temp_file, txt_file):
+        if USE_CACHE and get_cache().restore(filehash, cache_version(), final_txt_path(txt_file)):
+            converted = True
+            log_success("CACHE_HIT", filepath.name, "", filepath)
+        else:
+            converted = convert_to_txt(src_file, txt_file, filepath.name, data)
+            if converted:
+                # В кэш попадает уже нормализованный результат
+                txt_file = finish_txt(txt_file)
+                if USE_CACHE:
+                    get_cache().store(filehash, cache_version(), txt_file, filepath.name)
+
+        if converted:
+            get_journal().record(filepath.name, STATE_CONVERTED)
             # Перемещаем оригинал
             processed_file = PROCESSED_DIR / filepath.name
             shutil.move(str(filepath), str(processed_file))
+            get_journal().record(filepath.name, STATE_MOVED)
             log_success("CONVERTED", filepath.name, "", filepath)
             return True
 
+        get_journal().record(filepath.name, STATE_FAILED)
         return False
     except Exception as e:
-        log_error(filepath.name, f"Process error: {str(e)}", filepath)
+        log_error(filepath.name, f"Process error: {str(e)}", filepath, e)
+        get_journal().record(filepath.name, STATE_FAILED)
         return False
     finally:
+        _known_hashes.clear()
         # Удаляем временный файл
         if 'temp_file' in locals() and temp_file.exists():
             try:
@@ -223,32 +438,207 @@ def process_file(filepath):
                 pass
 
 
+def process_file_in_worker(filepath):
+    """Обработка файла в процессе пула: возвращает результат и строки лога с событиями"""
+    global _log_buffer
+    _log_buffer = []
+    try:
+        return process_file(filepath), _log_buffer
+    finally:
+        _log_buffer = None
+
+
+def collect_result(filepath, future):
+    """Забирает результат из пула и пишет его строки лога единым писателем"""
+    try:
+        ok, rows = future.result()
+    except Exception as e:
+        log_error(filepath.name, f"Worker error: {str(e)}", error=e)
+        return False
+    write_log_rows(rows)
+    return ok
+
+
+def process_files_sequential(files, total=None, on_done=None):
+    """Последовательная обработка файлов в текущем процессе"""
+    success_count = 0
+    with tqdm(total=total, desc="Обработка") as progress:
+        for file in files:
+            if file is None:
+                # Режим наблюдения: новых файлов пока нет
+                get_log_writer().flush()
+                get_journal().compact()
+                continue
+            if file.is_file() and process_file(file):
+                success_count += 1
+            if on_done is not None:
+                on_done(file)
+            progress.update(1)
+    return success_count
+
+
+def process_files_parallel(files, workers, total=None, on_done=None):
+    """Параллельная обработка файлов пулом процессов с ограничением очереди"""
+    success_count = 0
+    max_in_flight = workers * MAX_IN_FLIGHT_PER_WORKER
+    in_flight = deque()
+
+    def collect(filepath, future):
+        ok = collect_result(filepath, future)
+        if on_done is not None:
+            on_done(filepath)
+        progress.update(1)
+        return ok
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, tqdm(total=total, desc="Обработка") as progress:
+        try:
+            for file in files:
+                if file is None:
+                    # Режим наблюдения: новых файлов пока нет - забираем готовые результаты
+                    while in_flight and in_flight[0][1].done():
+                        success_count += collect(*in_flight.popleft())
+                    get_log_writer().flush()
+                    if not in_flight:
+                        # Процессы пула простаивают - журнал можно переписать
+                        get_journal().compact()
+                    continue
+
+                if not file.is_file():
+                    progress.update(1)
+                    continue
+
+                in_flight.append((file, pool.submit(process_file_in_worker, file)))
+                # Результаты забираем в порядке постановки, не держа в очереди больше max_in_flight задач
+                if len(in_flight) >= max_in_flight:
+                    success_count += collect(*in_flight.popleft())
+
+            while in_flight:
+                success_count += collect(*in_flight.popleft())
+        except KeyboardInterrupt:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    return success_count
+
+
+def recover_from_journal(journal):
+    """Разбирает файлы, прерванные при прошлом запуске. Возвращает те, что нужно конвертировать заново"""
+    resume = []
+    for name, state in journal.interrupted().items():
+        # Временная копия могла остаться недописанной
+        temp_file = TXT_DIR / f"temp_{name}"
+        if temp_file.exists():
+            temp_file.unlink()
+
+        source = SOURCE_DIR / name
+        if not source.exists():
+            # Упали между перемещением исходника и записью в журнал (или файл убрали вручную)
+            journal.record(name, STATE_MOVED)
+            continue
+
+        if state == STATE_CONVERTED and final_txt_path(TXT_DIR / f"{source.stem}.txt").exists():
+            # TXT уже готов, осталось переместить исходник
+            processed_file = PROCESSED_DIR / name
+            shutil.move(str(source), str(processed_file))
+            journal.record(name, STATE_MOVED)
+            log_success("CONVERTED", name, "resumed from journal", processed_file)
+            continue
+
+        resume.append(source)
+    return resume
+
+
+def journaled(files, journal):
+    """Отмечает в журнале файлы, взятые в работу"""
+    for file in files:
+        journal.record(file.name, STATE_QUEUED)
+        yield file
+
+
+def process_files(files, workers, total=None, on_done=None):
+    if workers > 1:
+        return process_files_parallel(files, workers, total, on_done)
+    return process_files_sequential(files, total, on_done)
+
+
 # ================== ЗАПУСК СКРИПТА ==================
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="Конвертация DOC/DOCX/RTF в TXT")
+    parser.add_argument("-w", "--workers", dest="workers", type=int, default=1,
+                        help="Количество процессов конвертации (default: %(default)s)")
+    parser.add_argument("--limit", dest="limit", type=int, default=None,
+                        help="Обработать не больше N файлов и остановиться; следующий запуск продолжит по журналу")
+    parser.add_argument("--watch", dest="watch", action="store_true",
+                        help="После обработки имеющихся файлов следить за папкой и конвертировать новые")
+    return parser
+
+
 def main():
+    global _journal
+    args = build_parser().parse_args()
     print(f"🔄 Запуск конвертации. Лог: {LOG_FILE}")
     if not setup_environment():
         return
 
-    try:
-        files = list(SOURCE_DIR.glob('*'))
-        total_files = len(files)
-        print(f"🔍 Найдено файлов: {total_files}")
+    watcher = None
+    scan = None
+    processed_count = 0
 
-        success_count = 0
-        for file in tqdm(files, desc="Обработка"):
-            if file.is_file():
-                if process_file(file):
-                    success_count += 1
+    def count_done(_file):
+        nonlocal processed_count
+        processed_count += 1
+
+    try:
+        _journal = ConversionJournal(JOURNAL_FILE)
+        if args.watch:
+            # Наблюдение включаем до сканирования, чтобы не пропустить файлы, пришедшие во время пачки
+            watcher = DirectoryWatcher(SOURCE_DIR)
+
+        # Сначала доводим файлы, прерванные прошлым запуском; обработанные в этом проходе не трогаем
+        resume = recover_from_journal(_journal)
+        failed = _journal.failed()
+        if resume or failed:
+            print(f"⏩ Продолжение прерванного прохода: повторно {len(resume)}, "
+                  f"пропускается с ошибкой {len(failed)}")
+        scan = SourceScan(SOURCE_DIR, SCAN_STATE_FILE, done=failed | {file.name for file in resume})
+        if scan.estimated_total is not None:
+            print(f"🔍 Файлов в прошлом проходе: ~{scan.estimated_total}")
+        if args.workers > 1:
+            print(f"⚙️ Процессов конвертации: {args.workers}")
+
+        # Файлы берутся из каталога по мере обработки, без предварительного списка
+        files = chain(resume, scan)
+        total = scan.remaining_estimate()
+        if args.limit is not None:
+            files = islice(files, args.limit)
+            total = args.limit if total is None else min(total, args.limit)
+        success_count = process_files(journaled(files, _journal), args.workers, total, count_done)
+        print(f"✅ Готово. Успешно: {success_count}/{processed_count}")
+
+        if scan.complete:
+            # Проход завершён - журнал больше не нужен
+            scan.finish()
+            _journal.reset()
+        else:
+            print(f"⏸️ Обработано {processed_count} файлов, следующий запуск продолжит с этого места")
 
-        print(f"✅ Готово. Успешно: {success_count}/{total_files}")
+        if watcher is not None:
+            print(f"👀 Ожидание новых файлов в {SOURCE_DIR} ({watcher.kind}), Ctrl+C для остановки")
+            process_files(watch_directory(watcher), args.workers)
     except KeyboardInterrupt:
         print("⛔ Прервано пользователем")
     except Exception as e:
         print(f"🔥 Ошибка: {e}")
     finally:
-        if LOCK_FILE.exists():
-            LOCK_FILE.unlink()
+        if scan is not None:
+            scan.close()
+        if watcher is not None:
+            watcher.close()
+        get_log_writer().close()
+        if _journal is not None:
+            _journal.close()
+        _lock.release()
         print(f"📊 Результаты сохранены в {LOG_FILE}")
 
 
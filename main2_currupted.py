@@ -1,15 +1,25 @@
 import os
-import shutil
+import csv
+import hashlib
+from bisect import bisect_left, bisect_right, insort
 from collections import defaultdict
+from itertools import count
 from pathlib import Path
 from datetime import datetime
 import re
+from file_index import indexed_files
+from move_planner import MovePlan, execute_plan
 
 # ================== КОНФИГУРАЦИЯ ==================
 SOURCE_DIR = Path("data/test")
 DESTINATION_DIR = Path("data/output")
 TEMP_DIR = Path("Z:/temp_files")  # Буферная папка для временных файлов
 LOG_FILE = Path(f"logs/rename_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+USE_FILE_INDEX = True  # Брать размеры и время изменения буфера из общего индекса (data/file_index.sqlite)
+SIZE_TOLERANCE_PERCENT = 1  # Нечёткое совпадение: допуск по размеру (%)
+MTIME_TOLERANCE = 10  # ...и по времени изменения (секунды)
+CONFIRM_WITH_HASH = False  # Принимать совпадение, только если совпадает хеш начала файла
+HEAD_HASH_SIZE = 64 * 1024  # Сколько байт с начала файла хешировать для подтверждения
 
 
 # ================== ФУНКЦИИ ==================
@@ -35,11 +45,17 @@ def setup_environment():
         return False
 
 
+def log_actions(rows):
+    """Логирование пачки действий одной записью: rows - (operation, original_name, temp_name, new_name, status, error)"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(LOG_FILE, 'a', encoding='utf-8', newline='') as f:
+        csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator='\n').writerows(
+            (timestamp, *row) for row in rows)
+
+
 def log_action(operation, original_name, temp_name="", new_name="", status="", error=""):
     """Логирование действий"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_FILE, 'a', encoding='utf-8') as f:
-        f.write(f'"{timestamp}","{operation}","{original_name}","{temp_name}","{new_name}","{status}","{error}"\n')
+    log_actions([(operation, original_name, temp_name, new_name, status, error)])
 
 
 def clean_filename(filename):
@@ -128,22 +144,72 @@ def get_source_files_info():
         return []
 
 
+class BufferIndex:
+    """Файлы буфера, разложенные по секундам mtime; в каждой секунде - отсортированы по размеру.
+
+    Поиск смотрит только 2 * MTIME_TOLERANCE + 1 соседних секунд и в каждой
+    двоичным поиском берёт диапазон размеров, а не перебирает весь буфер.
+    """
+
+    def __init__(self):
+        self.buckets = defaultdict(list)  # mtime (с) -> [(размер, порядковый номер, путь)]
+        self._seq = count()  # При равном размере раньше отдается файл, добавленный раньше
+
+    def add(self, size, mtime_rounded, path):
+        insort(self.buckets[mtime_rounded], (size, next(self._seq), path))
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def candidates(self, size, mtime_rounded):
+        """Файлы в пределах допусков, от ближайшего по размеру и времени"""
+        delta = max(size, 1) * SIZE_TOLERANCE_PERCENT / 100
+        found = []
+        for mtime in range(mtime_rounded - MTIME_TOLERANCE, mtime_rounded + MTIME_TOLERANCE + 1):
+            bucket = self.buckets.get(mtime)
+            if not bucket:
+                continue
+            low = bisect_left(bucket, (size - delta,))
+            high = bisect_right(bucket, (size + delta, float('inf')))
+            for item in bucket[low:high]:
+                found.append((abs(item[0] - size), abs(mtime - mtime_rounded), item[1], mtime, item))
+        found.sort()
+        return [(mtime, item) for *_, mtime, item in found]
+
+    def take(self, mtime, item):
+        """Убирает использованный файл, чтобы не отдать его повторно"""
+        bucket = self.buckets[mtime]
+        del bucket[bisect_left(bucket, item)]
+
+
+def get_head_hash(filepath):
+    """MD5 первых HEAD_HASH_SIZE байт файла"""
+    with open(filepath, 'rb') as f:
+        return hashlib.md5(f.read(HEAD_HASH_SIZE)).hexdigest()
+
+
 def create_buffer_files_map(buffer_dir):
-    """Создает словарь файлов из буферной папки с ключами (размер, время_модификации)"""
+    """Создает индекс файлов буферной папки по (время_модификации, размер)"""
     print(f"🔄 Индексирование файлов в буферной папке {buffer_dir}...")
-    buffer_files_map = defaultdict(list)
+    buffer_index = BufferIndex()
     files_count = 0
 
     try:
+        if USE_FILE_INDEX:
+            # Индекс перечитывает только изменившиеся файлы буфера
+            for indexed in indexed_files(buffer_dir):
+                buffer_index.add(indexed.size, round(indexed.mtime_ns / 1e9), str(indexed.path))
+                files_count += 1
+            print(f"✅ Индексирование завершено. Всего файлов: {files_count}")
+            return buffer_index
+
         # Используем os.scandir для эффективного обхода директории
         for entry in os.scandir(buffer_dir):
             if entry.is_file():
                 try:
                     file_stat = entry.stat()
-                    size = file_stat.st_size
                     # Округляем время до секунд для более надежного сравнения
-                    mtime_rounded = round(file_stat.st_mtime)
-                    buffer_files_map[(size, mtime_rounded)].append(entry.path)
+                    buffer_index.add(file_stat.st_size, round(file_stat.st_mtime), entry.path)
                     files_count += 1
 
                     # Индикатор прогресса для больших директорий
@@ -154,50 +220,39 @@ def create_buffer_files_map(buffer_dir):
                     print(f"  ⚠️ Ошибка при индексировании файла {entry.name}: {e}")
 
         print(f"✅ Индексирование завершено. Всего файлов: {files_count}")
-        return buffer_files_map
+        return buffer_index
     except Exception as e:
         print(f"❌ Ошибка при индексировании буферной папки: {e}")
-    return buffer_files_map
+    return buffer_index
+
 
+def find_matching_file_in_buffer(source_file, buffer_index):
+    """Находит соответствующий файл в буфере по размеру и времени модификации.
 
-def find_matching_file_in_buffer(source_file, buffer_files_map):
-    """Находит соответствующий файл в буфере по размеру и времени модификации"""
+    Сначала точное совпадение, затем ближайшее в пределах ±1% размера и ±10 секунд;
+    с CONFIRM_WITH_HASH кандидат принимается, только если совпадает начало файла.
+    """
     try:
         # Проверяем, что нам передали - путь к файлу или словарь с метаданными
         if isinstance(source_file, dict):
             # Если словарь, берем размер и время из него
+            path = source_file['path']
             size = source_file['size']
             mtime_rounded = round(source_file['mtime'])
         else:
             # Если путь к файлу, получаем метаданные
+            path = source_file
             file_stat = os.stat(source_file)
             size = file_stat.st_size
             mtime_rounded = round(file_stat.st_mtime)
 
-        # Прямое соответствие по размеру и времени
-        key = (size, mtime_rounded)
-        if key in buffer_files_map and buffer_files_map[key]:
-            matching_file = buffer_files_map[key][0]
-            # Удаляем использованный файл из списка, чтобы не использовать его повторно
-            buffer_files_map[key].pop(0)
-            return matching_file
-
-        # Если точного совпадения нет, ищем по близости размера (±1%)
-        # и времени модификации (±10 секунд)
-        for potential_key, files in buffer_files_map.items():
-            if not files:
+        source_hash = get_head_hash(path) if CONFIRM_WITH_HASH else None
+        for mtime, item in buffer_index.candidates(size, mtime_rounded):
+            matching_file = item[2]
+            if source_hash is not None and get_head_hash(matching_file) != source_hash:
                 continue
-
-            potential_size, potential_time = potential_key
-
-            # Проверяем близость размера (в пределах 1%)
-            size_diff_percent = abs(potential_size - size) / max(size, 1) * 100
-            time_diff_seconds = abs(potential_time - mtime_rounded)
-
-            if size_diff_percent <= 1 and time_diff_seconds <= 10:
-                matching_file = files[0]
-                files.pop(0)
-                return matching_file
+            buffer_index.take(mtime, item)
+            return matching_file
 
         # Файл не найден
         return None
@@ -208,11 +263,15 @@ def find_matching_file_in_buffer(source_file, buffer_files_map):
 
 
 def process_files(source_dir, buffer_dir, output_dir, test_mode=False):
-    """Обрабатывает файлы в исходной папке, находит соответствия в буфере и копирует их"""
+    """Обрабатывает файлы в исходной папке, находит соответствия в буфере и копирует их.
+
+    Сначала подбираются все соответствия и имена (план копирования), затем файлы
+    копируются пулом потоков, а лог пишется одним блоком.
+    """
     # Создаем словарь файлов из буферной папки
     print(f"🔄 Создание карты файлов из буферной папки...")
-    buffer_files_map = create_buffer_files_map(buffer_dir)
-    print(f"📊 Проиндексировано файлов в буфере: {sum(len(files) for files in buffer_files_map.values())}")
+    buffer_index = create_buffer_files_map(buffer_dir)
+    print(f"📊 Проиндексировано файлов в буфере: {len(buffer_index)}")
 
     # Получаем информацию о файлах
     source_files_info = get_source_files_info()
@@ -220,6 +279,8 @@ def process_files(source_dir, buffer_dir, output_dir, test_mode=False):
 
     matched_count = 0
     processed_count = 0
+    plan = MovePlan()
+    log_rows = []  # Строки лога в порядке обработки; у копий статус проставляется после выполнения
 
     # Обрабатываем каждый файл
     for file_info in source_files_info:
@@ -233,7 +294,7 @@ def process_files(source_dir, buffer_dir, output_dir, test_mode=False):
         print(f"  • Размер оригинала: {file_info['size']} байт")
         print(f"  • Время модификации: {datetime.fromtimestamp(file_info['mtime'])}")
 
-        matching_file = find_matching_file_in_buffer(file_info, buffer_files_map)
+        matching_file = find_matching_file_in_buffer(file_info, buffer_index)
 
         if matching_file:
             # Создаем выходную директорию, если она не существует
@@ -243,26 +304,41 @@ def process_files(source_dir, buffer_dir, output_dir, test_mode=False):
             clean_name = clean_filename(filename)
             new_filepath = Path(output_dir) / clean_name
 
-            # Если файл с таким именем уже существует, добавляем счетчик
+            # Если файл с таким именем уже существует (или запланирован), добавляем счетчик
             counter = 1
-            while new_filepath.exists():
+            while not plan.is_free(new_filepath):
                 name_stem = Path(clean_name).stem
                 name_stem = re.sub(r'_\d+$', '', name_stem)  # Удаляем предыдущие счетчики
                 new_name = f"{name_stem}_{counter}.docx"
                 new_filepath = Path(output_dir) / new_name
                 counter += 1
 
-            # Копируем файл из буфера с очищенным именем
-            shutil.copy2(matching_file, new_filepath)
-            matched_count += 1
-            print(f"✅ Файл найден и скопирован: {matching_file} -> {new_filepath}")
-            log_action("COPY", filename, Path(matching_file).name, new_filepath.name, "SUCCESS")
+            # Копирование файла из буфера с очищенным именем - в план
+            move = plan.add(matching_file, new_filepath, copy=True)
+            print(f"✅ Файл найден: {matching_file} -> {new_filepath}")
+            log_rows.append((filename, move))
         else:
             print(f"❌ Не найдено соответствия для файла {filename}")
-            log_action("MATCH", filename, "", "", "ERROR", "Файл не найден в буфере")
+            log_rows.append((filename, None))
 
         processed_count += 1
 
+    if len(plan):
+        print(f"\n🔄 Копирование {len(plan)} файлов...")
+    errors = dict(execute_plan(plan))
+
+    rows = []
+    for filename, move in log_rows:
+        if move is None:
+            rows.append(("MATCH", filename, "", "", "ERROR", "Файл не найден в буфере"))
+        elif errors[move] is None:
+            matched_count += 1
+            rows.append(("COPY", filename, move.src.name, move.dst.name, "SUCCESS", ""))
+        else:
+            print(f"❌ Ошибка копирования {move.src} -> {move.dst}: {errors[move]}")
+            rows.append(("COPY", filename, move.src.name, move.dst.name, "ERROR", str(errors[move])))
+    log_actions(rows)
+
     print(f"\n📊 Итоги: обработано {processed_count} файлов, найдено соответствий: {matched_count}")
     return matched_count
 
@@ -0,0 +1,194 @@
+import os
+import sys
+import queue
+import argparse
+import threading
+from pathlib import Path
+from file_index import get_file_index
+from text_normalize import TXT_SUFFIXES, split_txt_name
+
+# ================== КОНФИГУРАЦИЯ ==================
+PROCESSED_DIR = Path("data/processed_files")  # Папка с doc/docx файлами
+TXT_DIR = Path("data/test_txt")  # Основная папка с txt-файлами
+WORK_QUEUE_FILE = Path("data/missing_conversions.queue")  # Очередь файлов на конвертацию (путь на строку)
+SOURCE_EXTENSIONS = ('.doc', '.docx')
+PREFETCH_DIRS = 64  # Сколько прочитанных папок каждого дерева держим наготове
+
+
+# ================== ОБХОД ДЕРЕВЬЕВ ==================
+
+def _split_name(name):
+    stem, ext = os.path.splitext(name)
+    return stem.lower(), ext.lower()
+
+
+def walk_listings(root, extensions):
+    """Папки дерева в порядке возрастания относительного пути (кортежа частей).
+
+    Для каждой папки - (ключ, путь, [(стем в нижнем регистре, расширение, имя)]),
+    список файлов отсортирован. Обход через os.scandir в глубину с сортировкой
+    подпапок, поэтому в памяти только стек и одна папка, а порядок папок
+    совпадает у обоих деревьев и их можно сливать за один проход.
+    """
+    root = Path(root)
+    stack = [((), str(root))]
+    while stack:
+        key, dir_path = stack.pop()
+        files, subdirs = [], []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.name.lower().endswith(extensions) and entry.is_file():
+                            files.append((*_split_name(entry.name), entry.name))
+                    except OSError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        files.sort()
+        yield key, dir_path, files
+        # Ключи папок интернируются: одни и те же имена повторяются в обоих деревьях
+        children = sorted((sys.intern(os.path.normcase(name)), name) for name in subdirs)
+        for part, name in reversed(children):
+            stack.append((key + (part,), os.path.join(dir_path, name)))
+
+
+def index_listings(root, extensions):
+    """То же, что walk_listings, но списки папок и файлов берутся из общего индекса"""
+    index = get_file_index()
+    index.refresh(root, recursive=True)
+    resolved = Path(root).resolve()
+    directories = []
+    for directory in index.directories(resolved):
+        parts = directory.relative_to(resolved).parts
+        directories.append((tuple(sys.intern(os.path.normcase(part)) for part in parts), directory))
+    directories.sort()
+    for key, directory in directories:
+        files = sorted((*_split_name(indexed.name), indexed.name)
+                       for indexed in index.files(directory, extensions=extensions))
+        yield key, str(directory), files
+
+
+def prefetch(iterable, size=PREFETCH_DIRS):
+    """Читает итератор в отдельном потоке (обход второго дерева идёт параллельно)"""
+    items = queue.Queue(maxsize=size)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        items.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+# ================== ПЛАН ==================
+
+def diff_directory(sources, txt_stems):
+    """Файлы одной папки, которым нужна конвертация (оба списка отсортированы по стему).
+
+    Одиночный файл - если нет txt с тем же стемом; из нескольких файлов с одним
+    стемом (.doc идет раньше .docx) при наличии txt пропускается только первый.
+    """
+    missing = []
+    t = 0
+    i = 0
+    while i < len(sources):
+        stem = sources[i][0]
+        j = i
+        while j < len(sources) and sources[j][0] == stem:
+            j += 1
+        while t < len(txt_stems) and txt_stems[t] < stem:
+            t += 1
+        has_txt = t < len(txt_stems) and txt_stems[t] == stem
+        group = sources[i:j]
+        missing.extend(name for _, _, name in (group[1:] if has_txt else group))
+        i = j
+    return missing
+
+
+def plan_missing_conversions(source_root=PROCESSED_DIR, txt_root=TXT_DIR, extensions=SOURCE_EXTENSIONS,
+                             use_index=False):
+    """Исходные файлы без txt: пути внутри source_root, папка за папкой.
+
+    Оба дерева читаются потоково и сливаются по отсортированным ключам папок,
+    внутри папки - по отсортированным стемам; память не растёт с числом файлов.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    if use_index:
+        # Соединение с индексом однопоточное; списки и так читаются из базы без обхода диска
+        txt_listings = index_listings(txt_root, TXT_SUFFIXES)
+        source_listings = index_listings(source_root, extensions)
+    else:
+        txt_listings = prefetch(walk_listings(txt_root, TXT_SUFFIXES))
+        source_listings = prefetch(walk_listings(source_root, extensions))
+    txt_key, txt_files = None, []
+    txt_done = False
+
+    for key, dir_path, sources in source_listings:
+        # Догоняем дерево txt до текущей папки
+        while not txt_done and (txt_key is None or txt_key < key):
+            try:
+                txt_key, _, txt_files = next(txt_listings)
+            except StopIteration:
+                txt_done = True
+                txt_key, txt_files = None, []
+        # Стем берётся без .txt/.txt.zst: сжатый x.txt.zst тоже считается готовым txt
+        txt_stems = sorted(split_txt_name(name)[0].lower() for _, _, name in txt_files) if txt_key == key else []
+
+        for name in diff_directory(sources, txt_stems):
+            yield Path(dir_path) / name
+
+
+# ================== ОЧЕРЕДЬ ==================
+
+def write_work_queue(files, root=PROCESSED_DIR, path=WORK_QUEUE_FILE):
+    """Пишет очередь (пути относительно root, по одному на строку). Возвращает число файлов"""
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    count = 0
+    with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+        for file in files:
+            f.write(f"{os.path.relpath(file, root)}\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def read_work_queue(root=PROCESSED_DIR, path=WORK_QUEUE_FILE, shard=0, shards=1):
+    """Пути из очереди; shard/shards - доля очереди для одного из параллельных конвертеров"""
+    root = Path(root)
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f):
+            if number % shards == shard:
+                yield root / line.rstrip("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="План конвертации: исходники без txt -> файл очереди")
+    parser.add_argument("--source", type=Path, default=PROCESSED_DIR, help="Папка с исходными файлами")
+    parser.add_argument("--txt", type=Path, default=TXT_DIR, help="Папка с txt-файлами")
+    parser.add_argument("--queue", type=Path, default=WORK_QUEUE_FILE, help="Файл очереди")
+    parser.add_argument("--index", action="store_true", help="Брать списки файлов из общего индекса")
+    args = parser.parse_args(argv)
+
+    count = write_work_queue(plan_missing_conversions(args.source, args.txt, use_index=args.index),
+                             args.source, args.queue)
+    print(f"📋 Файлов для конвертации: {count}, очередь: {args.queue}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ from docx import Document
 import win32com.client
 from tqdm import tqdm
 from datetime import datetime
+from missing_conversions import plan_missing_conversions, write_work_queue, read_work_queue
+from conversion_events import EventStore
+from text_normalize import TXT_SUFFIXES, txt_exists
 
 # ================== КОНФИГУРАЦИЯ ==================
 PROCESSED_DIR = Path("data/processed_files")  # Папка с doc/docx файлами
@@ -12,21 +15,24 @@ TXT_DIR = Path("data/test_txt")  # Основная папка с txt-файла
 MISSING_DIR = TXT_DIR / "missing"  # Папка для недостающих txt-файлов
 LOGS_DIR = Path("logs")  # Папка для логов
 LOG_FILE = LOGS_DIR / f"conversion_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+WORK_QUEUE_FILE = Path("data/missing_conversions.queue")  # Очередь файлов на конвертацию
 
 # Поддерживаемые форматы исходных файлов
 SOURCE_EXTENSIONS = ('.doc', '.docx')
+USE_FILE_INDEX = True  # Брать списки файлов из общего индекса (data/file_index.sqlite)
+USE_EVENT_STORE = True  # Дублировать лог событиями в data/conversion_events.sqlite (запросы: conversion_events.py)
 
 
 # ================== ФУНКЦИИ КОНВЕРТАЦИИ ==================
 
 def convert_to_txt(doc_path, txt_path):
-    """Конвертирует doc/docx в txt"""
+    """Конвертирует doc/docx в txt. Возвращает (успех, ошибка: исключение или текст)"""
     try:
         if doc_path.suffix.lower() == '.docx':
             doc = Document(doc_path)
             text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
             txt_path.write_text(text, encoding='utf-8')
-            return True
+            return True, None
 
         elif doc_path.suffix.lower() == '.doc':
             if os.name == 'nt':
@@ -37,52 +43,27 @@ def convert_to_txt(doc_path, txt_path):
                     doc.SaveAs(str(txt_path.resolve()), FileFormat=2)
                     doc.Close()
                     word.Quit()
-                    return True
+                    return True, None
                 except Exception as e:
                     print(f"Ошибка конвертации DOC: {e}")
-                    return False
-            return False
+                    return False, e
+            return False, "DOC без Word (не Windows)"
+
+        return False, f"Unsupported format: {doc_path.suffix}"
 
     except Exception as e:
         print(f"Ошибка конвертации {doc_path.name}: {e}")
-        return False
+        return False, e
 
 
 # ================== ОСНОВНАЯ ЛОГИКА ==================
 def find_missing_conversions():
-    """Находит doc/docx файлы для конвертации с учетом существующих txt"""
-    # Получаем существующие txt файлы
-    existing_txt = {
-        (txt_file.parent.relative_to(TXT_DIR), txt_file.stem.lower())
-        for txt_file in TXT_DIR.rglob('*.txt')
-    }
-
-    # Собираем все doc/docx файлы по именам
-    doc_files_by_name = {}
-    for ext in SOURCE_EXTENSIONS:
-        for doc_file in PROCESSED_DIR.rglob(f'*{ext}'):
-            key = (doc_file.relative_to(PROCESSED_DIR).parent, doc_file.stem.lower())
-            if key not in doc_files_by_name:
-                doc_files_by_name[key] = []
-            doc_files_by_name[key].append(doc_file)
-
-    # Определяем файлы для конвертации
-    missing_files = []
-    for key, files in doc_files_by_name.items():
-        if len(files) == 1:  # Один файл
-            if key not in existing_txt:  # Нет txt файла
-                missing_files.append(files[0])
-        else:  # Несколько файлов с одинаковым именем
-            # Сортируем файлы (.doc идут первыми)
-            files.sort(key=lambda x: x.suffix.lower())
-            if key not in existing_txt:
-                # Если нет txt, конвертируем все файлы
-                missing_files.extend(files)
-            else:
-                # Если есть txt, конвертируем только дополнительные файлы
-                missing_files.extend(files[1:])
+    """Находит doc/docx файлы для конвертации с учетом существующих txt и пишет очередь.
 
-    return missing_files
+    Возвращает число файлов в очереди WORK_QUEUE_FILE.
+    """
+    missing_files = plan_missing_conversions(PROCESSED_DIR, TXT_DIR, SOURCE_EXTENSIONS, use_index=USE_FILE_INDEX)
+    return write_work_queue(missing_files, PROCESSED_DIR, WORK_QUEUE_FILE)
 
 
 def process_missing_files():
@@ -91,15 +72,15 @@ def process_missing_files():
     MISSING_DIR.mkdir(parents=True, exist_ok=True)
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Получаем список файлов для конвертации
-    missing_files = find_missing_conversions()
+    # Получаем очередь файлов для конвертации
+    missing_count = find_missing_conversions()
 
-    if not missing_files:
+    if not missing_count:
         print("Все файлы уже сконвертированы в txt")
         return
 
     start_time = time.time()
-    print(f"Найдено {len(missing_files)} файлов для конвертации")
+    print(f"Найдено {missing_count} файлов для конвертации")
     print(f"Лог будет сохранен в: {LOG_FILE}")
 
     # Заголовок лог-файла
@@ -110,8 +91,9 @@ def process_missing_files():
         log.write(f"Папка для txt-файлов: {MISSING_DIR}\n")
         log.write("=" * 50 + "\n")
 
+    events = EventStore(Path(__file__).stem) if USE_EVENT_STORE else None
     success_count = 0
-    for doc_file in tqdm(missing_files, desc="Конвертация"):
+    for doc_file in tqdm(read_work_queue(PROCESSED_DIR, WORK_QUEUE_FILE), total=missing_count, desc="Конвертация"):
         rel_path = doc_file.relative_to(PROCESSED_DIR)
         txt_subdir = MISSING_DIR / rel_path.parent
         txt_subdir.mkdir(parents=True, exist_ok=True)
@@ -127,30 +109,38 @@ def process_missing_files():
 
             txt_file = txt_subdir / f"{new_name}.txt"
 
-            # Проверяем существование файла как в MISSING_DIR, так и в TXT_DIR
+            # Проверяем существование файла как в MISSING_DIR, так и в TXT_DIR (в том числе сжатого .txt.zst)
             main_txt = TXT_DIR / rel_path.parent / f"{new_name}.txt"
-            if not txt_file.exists() and not main_txt.exists():
+            if not txt_exists(txt_file) and not txt_exists(main_txt):
                 break
             counter += 1
 
-        if convert_to_txt(doc_file, txt_file):
+        converted, error = convert_to_txt(doc_file, txt_file)
+        if converted:
             success_count += 1
             status = "Успешно"
         else:
             status = "Ошибка"
+        if events is not None:
+            # Исходник - по имени файла, как у остальных конвертеров (failed_files сопоставляет по нему)
+            events.record("CONVERT", "SUCCESS" if converted else "ERROR", doc_file.name,
+                          txt_file.relative_to(MISSING_DIR), doc_file.suffix.lower().lstrip('.'), error or "")
 
         # Записываем в лог
         with open(LOG_FILE, 'a', encoding='utf-8') as log:
             log.write(
                 f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {status} | {rel_path} | {time.time() - start_time:.2f} сек\n")
 
+    if events is not None:
+        events.close()
+
     # Итоговая статистика
     with open(LOG_FILE, 'a', encoding='utf-8') as log:
         log.write("=" * 50 + "\n")
         log.write(
-            f"ИТОГО: Успешно {success_count}/{len(missing_files)} | Ошибок: {len(missing_files) - success_count}\n")
+            f"ИТОГО: Успешно {success_count}/{missing_count} | Ошибок: {missing_count - success_count}\n")
 
-    print(f"\nГотово. Успешно сконвертировано: {success_count}/{len(missing_files)}")
+    print(f"\nГотово. Успешно сконвертировано: {success_count}/{missing_count}")
     print(f"Недостающие txt-файлы сохранены в: {MISSING_DIR}")
 
 # ================== ДОПОЛНИТЕЛЬНАЯ ПРОВЕРКА ==================
@@ -158,7 +148,7 @@ def process_missing_files():
 def verify_file_counts():
     """Проверяет количество файлов в папках для отладки"""
     doc_files = [f for f in PROCESSED_DIR.rglob('*.*') if f.suffix.lower() in SOURCE_EXTENSIONS]
-    txt_files = list(TXT_DIR.rglob('*.txt'))
+    txt_files = [f for f in TXT_DIR.rglob('*.txt*') if f.name.lower().endswith(TXT_SUFFIXES)]
 
     # Создаем словарь для подсчета дубликатов
     name_counts = {}
@@ -0,0 +1,189 @@
+import os
+import sys
+import errno
+import shutil
+from pathlib import Path
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# ================== КОНФИГУРАЦИЯ ==================
+MOVE_WORKERS = 8  # Одновременных перемещений (на сетевом диске упираемся в задержку, а не в полосу)
+COPY_CHUNK_SIZE = 8 * 1024 * 1024  # Размер блока при копировании между файловыми системами
+
+# copy=True - копировать (исходник остаётся), иначе перемещать
+PlannedMove = namedtuple("PlannedMove", "src dst copy")
+
+# Ошибки copy_file_range, при которых копируем обычным способом
+_COPY_RANGE_FALLBACK = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def _key(path):
+    # На Windows имена регистронезависимы
+    return os.path.normcase(os.path.abspath(path))
+
+
+# ================== ПЛАН ==================
+
+class MovePlan:
+    """План перемещений/копирований: сначала собираются все пары, затем выполняются разом.
+
+    При добавлении проверяются коллизии: два хода в одну цель - ValueError; цель,
+    занятая файлом на диске, допустима, только если этот файл тоже уводится планом
+    (иначе ход при выполнении получает FileExistsError). Циклы (a -> b, b -> a)
+    разрываются при выполнении через временное имя.
+    """
+
+    def __init__(self):
+        self.moves = []
+        self._targets = set()  # Цели уже запланированных ходов
+        self._vacated = set()  # Исходники перемещений (после выполнения освободятся)
+        self._occupied = set()  # Цели, занятые файлами на диске, которые план пока не уводит
+
+    def __len__(self):
+        return len(self.moves)
+
+    def is_free(self, dst):
+        """Свободна ли цель с учетом диска и уже запланированных ходов"""
+        key = _key(dst)
+        if key in self._targets:
+            return False
+        return key in self._vacated or not os.path.lexists(dst)
+
+    def free_name(self, directory, filename, pattern="{stem}({n}){ext}"):
+        """Первое свободное имя вида filename, затем pattern с n = 1, 2, ..."""
+        directory = Path(directory)
+        target = directory / filename
+        stem, ext = os.path.splitext(filename)
+        n = 1
+        while not self.is_free(target):
+            target = directory / pattern.format(stem=stem, n=n, ext=ext)
+            n += 1
+        return target
+
+    def add(self, src, dst, copy=False):
+        """Добавляет ход. Цель другого хода - ValueError (имя нужно подобрать через free_name)"""
+        src, dst = Path(src), Path(dst)
+        src_key, dst_key = _key(src), _key(dst)
+        if src_key == dst_key:
+            return None
+        if dst_key in self._targets:
+            raise ValueError(f"Цель уже занята: {dst}")
+        if dst_key not in self._vacated and os.path.lexists(dst):
+            self._occupied.add(dst_key)
+        move = PlannedMove(src, dst, copy)
+        self.moves.append(move)
+        self._targets.add(dst_key)
+        if not copy:
+            self._vacated.add(src_key)
+            self._occupied.discard(src_key)
+        return move
+
+    def waves(self):
+        """Делит план на волны: ход попадает в волну, когда его цель не занята исходником другого хода"""
+        pending = list(self.moves)
+        result = []
+        while pending:
+            busy = {_key(move.src) for move in pending if not move.copy}
+            wave = [move for move in pending if _key(move.dst) not in busy]
+            if not wave:
+                # Остались только циклы: первый ход уводим на временное имя
+                move = pending[0]
+                temp = move.src.with_name(f".{move.src.name}.moving")
+                wave = [PlannedMove(move.src, temp, False)]
+                pending[0] = PlannedMove(temp, move.dst, False)
+            else:
+                in_wave = set(map(id, wave))
+                pending = [move for move in pending if id(move) not in in_wave]
+            result.append(wave)
+        return result
+
+
+# ================== ВЫПОЛНЕНИЕ ==================
+
+def copy_file_data(src, dst):
+    """Копирует содержимое файла средствами ядра (copy_file_range/sendfile), если они есть"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE):
+                    pass
+                return
+            except OSError as e:
+                if e.errno not in _COPY_RANGE_FALLBACK:
+                    raise
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+
+        if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+            offset = 0
+            while True:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, COPY_CHUNK_SIZE)
+                if not sent:
+                    return
+                offset += sent
+
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+
+
+def copy_file(src, dst):
+    """Аналог shutil.copy2: данные и метаданные (время изменения и т.п.)"""
+    copy_file_data(src, dst)
+    shutil.copystat(src, dst)
+
+
+def execute_move(move):
+    """Выполняет один ход: rename в пределах файловой системы, иначе копирование и удаление"""
+    if move.copy:
+        copy_file(move.src, move.dst)
+        return
+    try:
+        os.rename(move.src, move.dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        copy_file(move.src, move.dst)
+        os.unlink(move.src)
+
+
+def execute_plan(plan, workers=MOVE_WORKERS, progress=None):
+    """Выполняет план пулом потоков. Возвращает [(ход, ошибка или None)] в порядке плана.
+
+    Ходы одной волны независимы и идут параллельно; временные ходы разрыва циклов
+    в результат не попадают.
+    """
+    errors = {}
+    planned = {(_key(move.src), _key(move.dst)) for move in plan.moves}
+    # Цели, которые не освободятся: файл на диске, который план не уводит,
+    # и исходники ходов, которые не удалось выполнить
+    stuck = set(plan._occupied)
+
+    def run(move):
+        if _key(move.dst) in stuck:
+            return FileExistsError(errno.EEXIST, "Цель не освободилась", str(move.dst))
+        try:
+            execute_move(move)
+            return None
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for wave in plan.waves():
+            for move, error in zip(wave, pool.map(run, wave)):
+                errors[(_key(move.src), _key(move.dst))] = error
+                if error is not None and not move.copy:
+                    stuck.add(_key(move.src))
+                if progress is not None and (_key(move.src), _key(move.dst)) in planned:
+                    progress.update(1)
+
+    results = []
+    for move in plan.moves:
+        key = (_key(move.src), _key(move.dst))
+        if key in errors:
+            results.append((move, errors[key]))
+        else:
+            # Ход разбит на два через временное имя - ошибка любой половины
+            src_temp = move.src.with_name(f".{move.src.name}.moving")
+            results.append((move, errors.get((_key(move.src), _key(src_temp)))
+                            or errors.get((_key(src_temp), _key(move.dst)))))
+    return results
@@ -0,0 +1,104 @@
+import os
+import time
+import shutil
+from pathlib import Path
+from text_normalize import COMPRESSED_SUFFIX
+
+RESERVED_SUFFIX = ".reserved"  # Метка занятого имени, пока настоящий файл не записан
+STALE_RESERVATION_SECONDS = 24 * 3600  # Метки старше суток оставлены упавшими процессами
+
+
+class NameRegistry:
+    """Реестр занятых имён в папке для выдачи уникальных имён вида name(N).ext.
+
+    Папка сканируется один раз, дальше реестр обновляется сам, а для каждого
+    базового имени помнится следующий свободный номер, поэтому выдача имени не
+    перебирает name(1), name(2), ... через exists(). Имя закрепляется созданием
+    метки name.ext.reserved с O_EXCL: если то же имя успел занять другой процесс,
+    берётся следующий номер. Под самим именем до записи ничего не создаётся,
+    поэтому после падения в папке не остаётся пустых файлов.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(exist_ok=True, parents=True)
+        self.taken = set()
+        self.next_counter = {}
+        stale_before = time.time() - STALE_RESERVATION_SECONDS
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.endswith(RESERVED_SUFFIX):
+                    try:
+                        if entry.stat().st_mtime < stale_before:
+                            os.remove(entry.path)
+                            continue
+                    except OSError:
+                        pass
+                    name = name[:-len(RESERVED_SUFFIX)]
+                self.taken.add(self._key(name))
+                # Сжатый x.txt.zst (text_normalize) занимает и имя x.txt
+                if name.endswith(COMPRESSED_SUFFIX):
+                    self.taken.add(self._key(name[:-len(COMPRESSED_SUFFIX)]))
+
+    @staticmethod
+    def _key(name):
+        # На Windows имена файлов регистронезависимы
+        return os.path.normcase(name)
+
+    def _marker(self, name):
+        return self.directory / (name + RESERVED_SUFFIX)
+
+    def _claim(self, name):
+        """Создаёт метку имени; False - имя уже занято другим процессом"""
+        try:
+            fd = os.open(self._marker(name), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        # Файл мог появиться после сканирования папки: его владелец пишет файл до снятия метки
+        if (self.directory / name).exists() or (self.directory / (name + COMPRESSED_SUFFIX)).exists():
+            os.remove(self._marker(name))
+            return False
+        return True
+
+    def reserve(self, filename):
+        """Выдаёт свободное имя и создаёт для него метку .reserved"""
+        name, ext = os.path.splitext(filename)
+        base_key = self._key(filename)
+        counter = self.next_counter.get(base_key, 0)
+        while True:
+            candidate = filename if counter == 0 else f"{name}({counter}){ext}"
+            key = self._key(candidate)
+            if key not in self.taken:
+                self.taken.add(key)
+                if self._claim(candidate):
+                    break
+            counter += 1
+        self.next_counter[base_key] = counter + 1
+        return candidate
+
+    def commit(self, filename):
+        """Файл под выданным именем записан: снимает метку, имя остаётся занятым"""
+        try:
+            os.remove(self._marker(filename))
+        except FileNotFoundError:
+            pass
+
+    def release(self, filename):
+        """Освобождает имя, удаляя метку и недописанный файл под ним"""
+        self.taken.discard(self._key(filename))
+        for path in (self.directory / filename, self._marker(filename)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def move_into(src, dst):
+    """Перемещает файл под имя, выданное NameRegistry.reserve"""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # Другая файловая система
+        shutil.move(str(src), str(dst))
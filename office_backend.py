@@ -0,0 +1,270 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+try:
+    import win32com.client  # Только Windows с установленным MS Word
+except ImportError:
+    win32com = None
+
+try:
+    import uno  # Python-мост LibreOffice (пакет python3-uno)
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:
+    uno = None
+
+# ================== КОНФИГУРАЦИЯ ==================
+OFFICE_BACKEND = "auto"  # "auto", "com" (MS Word) или "libreoffice"
+SOFFICE_BIN = "soffice"  # Исполняемый файл LibreOffice
+SOFFICE_PIPE_PREFIX = "parse_gorsud_soffice"  # Имя pipe listener-а: префикс + PID + случайный суффикс
+SOFFICE_START_TIMEOUT = 60  # Сколько ждать запуска LibreOffice (секунды)
+SOFFICE_DOC_TIMEOUT = 120  # Сколько ждать загрузки и сохранения одного документа (секунды)
+
+_backend = None  # Запущенный конвертер, один на процесс
+
+
+class OfficeBackendUnavailable(Exception):
+    """На машине нет ни MS Word (COM), ни LibreOffice с UNO"""
+
+
+class OfficeDocumentError(Exception):
+    """Конвертер работает, но документ не открывается: файл битый, повтор не поможет"""
+
+
+# ================== MS WORD (COM) ==================
+
+class WordComBackend:
+    """MS Word через COM: один Word.Application на всю пачку файлов"""
+
+    name = "COM"
+
+    def __init__(self):
+        self.word = None
+        self.start_error = None  # Word не запустился: до конца пачки не пытаемся снова
+
+    def _app(self):
+        if self.start_error is not None:
+            raise OfficeBackendUnavailable(self.start_error)
+        if self.word is None:
+            try:
+                self.word = win32com.client.Dispatch("Word.Application")
+                self.word.visible = False
+            except Exception as e:
+                self.word = None
+                self.start_error = f"MS Word не запустился: {str(e)}"
+                raise OfficeBackendUnavailable(self.start_error) from e
+        return self.word
+
+    def _alive(self):
+        try:
+            self.word.Documents.Count
+            return True
+        except Exception:
+            return False
+
+    def extract_text(self, path):
+        """Открывает документ в уже запущенном Word и возвращает его текст"""
+        app = self._app()
+        try:
+            doc = app.Documents.Open(
+                os.path.abspath(path),
+                ReadOnly=True,
+                ConfirmConversions=False,
+                Format=0,
+                NoEncodingDialog=True,
+                AddToRecentFiles=False,
+                Visible=False,
+                OpenAndRepair=True
+            )
+        except Exception as e:
+            # Если упал сам Word (а не документ битый), следующий файл запустит его заново
+            if not self._alive():
+                self.close()
+                raise
+            raise OfficeDocumentError(f"Word не смог открыть документ: {str(e)}") from e
+        try:
+            return doc.Content.Text
+        finally:
+            doc.Close(False)
+
+    def close(self):
+        if self.word is not None:
+            try:
+                self.word.Quit()
+            except:
+                pass
+            self.word = None
+
+
+# ================== LIBREOFFICE (UNO) ==================
+
+def _props(**values):
+    """Кортеж PropertyValue для вызовов UNO"""
+    props = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name, prop.Value = name, value
+        props.append(prop)
+    return tuple(props)
+
+
+class LibreOfficeBackend:
+    """LibreOffice в режиме listener: soffice запускается один раз, документы грузятся через UNO.
+
+    Listener слушает именованный pipe, уникальный для процесса, поэтому не
+    подключается к чужому soffice. Загрузка и сохранение документа ограничены
+    SOFFICE_DOC_TIMEOUT: зависший soffice убивается и перезапускается со следующим файлом.
+    """
+
+    name = "LibreOffice"
+
+    def __init__(self, soffice=SOFFICE_BIN, pipe_name=None):
+        self.soffice = soffice
+        self.pipe_name = pipe_name or f"{SOFFICE_PIPE_PREFIX}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self.process = None
+        self.profile_dir = None
+        self.desktop = None
+        self.start_error = None  # soffice не запустился: до конца пачки не пытаемся снова
+        self.timed_out = False
+
+    def _connect(self):
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context)
+        context = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+        return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def _start(self):
+        if self.start_error is not None:
+            raise OfficeBackendUnavailable(self.start_error)
+        # Отдельный профиль, чтобы не конфликтовать с открытым у пользователя LibreOffice
+        self.profile_dir = tempfile.mkdtemp(prefix="soffice_profile_")
+        try:
+            self.process = subprocess.Popen(
+                [self.soffice, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+                 f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+                 f"-env:UserInstallation={Path(self.profile_dir).as_uri()}"],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            self.close()
+            self.start_error = f"LibreOffice не запустился: {str(e)}"
+            raise OfficeBackendUnavailable(self.start_error) from e
+
+        deadline = time.monotonic() + SOFFICE_START_TIMEOUT
+        while True:
+            try:
+                self.desktop = self._connect()
+                return
+            except NoConnectException:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    self.start_error = "LibreOffice не запустился"
+                    raise OfficeBackendUnavailable(self.start_error)
+                time.sleep(0.5)
+
+    def _kill(self):
+        """Срабатывает по таймауту документа: прерывает зависший вызов UNO"""
+        self.timed_out = True
+        if self.process is not None:
+            self.process.kill()
+
+    def extract_text(self, path):
+        """Загружает документ в запущенный LibreOffice и сохраняет его как UTF-8 текст"""
+        if self.process is not None and self.process.poll() is not None:
+            self.close()  # soffice завершился (или убит по таймауту) - перезапускаем
+        if self.desktop is None:
+            self._start()
+
+        fd, txt_file = tempfile.mkstemp(suffix=".txt")
+        os.close(fd)
+        doc = None
+        self.timed_out = False
+        watchdog = threading.Timer(SOFFICE_DOC_TIMEOUT, self._kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(path)), "_blank", 0,
+                _props(Hidden=True, ReadOnly=True, RepairPackage=True))
+            if doc is None:
+                raise OfficeDocumentError("LibreOffice не смог открыть документ")
+            doc.storeToURL(uno.systemPathToFileUrl(txt_file),
+                           _props(FilterName="Text (encoded)", FilterOptions="UTF8"))
+            with open(txt_file, 'r', encoding='utf-8-sig', errors='replace') as f:
+                return f.read()
+        except (OfficeBackendUnavailable, OfficeDocumentError):
+            raise
+        except Exception as e:
+            if self.timed_out:
+                # Документ, на котором soffice висит, повесит его и при повторе
+                self.close()
+                raise OfficeDocumentError(f"LibreOffice не обработал документ за {SOFFICE_DOC_TIMEOUT} с") from e
+            # Если упал сам soffice, следующий файл перезапустит его
+            if self.process is None or self.process.poll() is not None:
+                self.close()
+                raise
+            # soffice жив - не загрузился или не сохраняется сам документ
+            raise OfficeDocumentError(f"LibreOffice не смог обработать документ: {str(e)}") from e
+        finally:
+            watchdog.cancel()
+            if doc is not None and not self.timed_out:
+                try:
+                    doc.close(True)
+                except:
+                    pass
+            os.unlink(txt_file)
+
+    def close(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+# ================== ВЫБОР КОНВЕРТЕРА ==================
+
+def get_office_backend():
+    """Возвращает запущенный (или запускаемый при первом файле) офисный конвертер процесса"""
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    backend = OFFICE_BACKEND
+    if backend == "auto":
+        if os.name == 'nt' and win32com is not None:
+            backend = "com"
+        elif uno is not None and shutil.which(SOFFICE_BIN):
+            backend = "libreoffice"
+
+    if backend == "com" and win32com is not None:
+        _backend = WordComBackend()
+    elif backend == "libreoffice" and uno is not None and shutil.which(SOFFICE_BIN):
+        _backend = LibreOfficeBackend(shutil.which(SOFFICE_BIN))
+    else:
+        raise OfficeBackendUnavailable(f"Офисный конвертер недоступен (OFFICE_BACKEND={OFFICE_BACKEND})")
+    return _backend
+
+
+def close_office_backend():
+    """Закрывает офисный конвертер в конце пачки (следующая пачка снова попробует его запустить)"""
+    global _backend
+    if _backend is not None:
+        _backend.close()
+        _backend = None
@@ -0,0 +1,289 @@
+import re
+import codecs
+
+# ================== КОНФИГУРАЦИЯ ==================
+CHUNK_SIZE = 64 * 1024  # Размер блока чтения RTF
+DEFAULT_CODEPAGE = 1252  # Если в документе нет \ansicpg
+
+# Токены RTF: управляющее слово с параметром, \'xx, управляющий символ, скобка группы,
+# перевод строки (в RTF не значим), обычный текст
+TOKEN_RE = re.compile(
+    rb"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"
+    rb"|\\'([0-9a-fA-F]{2})"
+    rb"|\\([^a-zA-Z'])"
+    rb"|([{}])"
+    rb"|[\r\n]+"
+    rb"|[^\\{}\r\n]+"
+)
+
+# Группы без видимого текста: пропускаются целиком (картинки, таблицы стилей и т.п.)
+SKIP_DESTINATIONS = {
+    b"colortbl", b"stylesheet", b"info", b"pict", b"nonshppict", b"themedata",
+    b"colorschememapping", b"datastore", b"latentstyles", b"listtable", b"listoverridetable",
+    b"revtbl", b"rsidtbl", b"generator", b"xmlnstbl", b"filetbl", b"fldinst", b"objdata",
+    b"pgdsctbl", b"userprops", b"docvar", b"mmathPr", b"wgrffmtfilter",
+}
+
+# Управляющие слова, дающие текст
+CONTROL_TEXT = {
+    b"par": "\n", b"line": "\n", b"sect": "\n", b"page": "\n", b"row": "\n",
+    b"tab": "\t", b"cell": "\t", b"nestcell": "\t",
+    b"emdash": "\u2014", b"endash": "\u2013", b"bullet": "\u2022",
+    b"lquote": "\u2018", b"rquote": "\u2019", b"ldblquote": "\u201c", b"rdblquote": "\u201d",
+    b"emspace": " ", b"enspace": " ", b"qmspace": " ",
+}
+
+# Управляющие символы, дающие текст
+CONTROL_SYMBOLS = {
+    b"\\": "\\", b"{": "{", b"}": "}", b"~": "\u00a0", b"_": "-", b"-": "",
+    b"\n": "\n", b"\r": "\n",
+}
+
+# \fcharset -> кодовая страница (None - кодовая страница документа \ansicpg)
+CHARSET_CODEPAGES = {
+    0: None, 1: None, 2: None, 77: 10000, 128: 932, 129: 949, 130: 1361, 134: 936, 136: 950,
+    161: 1253, 162: 1254, 163: 1258, 177: 1255, 178: 1256, 186: 1257, 204: 1251, 222: 874,
+    238: 1250, 254: 437, 255: 850,
+}
+
+
+def codec_for(codepage):
+    """Имя кодека Python для кодовой страницы RTF"""
+    name = "utf-8" if codepage == 65001 else f"cp{codepage}"
+    try:
+        codecs.lookup(name)
+        return name
+    except LookupError:
+        return f"cp{DEFAULT_CODEPAGE}"
+
+
+class RtfDecoder:
+    """Потоковый разбор RTF в текст.
+
+    Учитывает вложенность групп, \\ansicpg и кодировки шрифтов (\\fcharset),
+    декодирует \\'xx и \\uN, пропускает служебные группы и \\bin без буферизации.
+    """
+
+    def __init__(self):
+        self.default_codepage = DEFAULT_CODEPAGE
+        self.font_codepages = {}  # номер шрифта -> кодовая страница
+        self.deff = None  # шрифт по умолчанию (\deff)
+        self.font_num = None  # шрифт, описываемый сейчас в \fonttbl
+
+        # Состояние текущей группы (сохраняется в стек на "{")
+        self.skip = False
+        self.uc = 1
+        self.codepage = None
+        self.in_fonttbl = False
+        self.stack = []
+
+        self.group_start = False  # Следующее управляющее слово - назначение группы
+        self.star = False  # Было \*: неизвестное назначение пропускается
+        self.uc_skip = 0  # Сколько символов замены пропустить после \uN
+        self.bin_remaining = 0  # Сколько сырых байт \bin ещё пропустить
+        self.high_surrogate = None
+        self.pending = bytearray()  # Байты \'xx, ждущие декодирования
+        self.pending_codec = None
+        self.out = []
+
+    # ---------- вывод ----------
+
+    def _current_codec(self):
+        return codec_for(self.codepage or self.default_codepage)
+
+    def _flush_pending(self):
+        if self.pending:
+            if not self.skip:
+                self.out.append(self.pending.decode(self.pending_codec, errors="replace"))
+            self.pending.clear()
+
+    def _emit(self, text):
+        self._flush_pending()
+        if not self.skip and text:
+            self.out.append(text)
+
+    def _emit_bytes(self, data):
+        codec = self._current_codec()
+        if self.pending and self.pending_codec != codec:
+            self._flush_pending()
+        self.pending_codec = codec
+        self.pending += data
+
+    def take_output(self):
+        """Забирает накопленный текст"""
+        self._flush_pending()
+        text = "".join(self.out)
+        self.out.clear()
+        return text
+
+    # ---------- группы ----------
+
+    def _push(self):
+        self._flush_pending()
+        self.stack.append((self.skip, self.uc, self.codepage, self.in_fonttbl))
+        self.group_start = True
+        self.star = False
+        self.uc_skip = 0
+
+    def _pop(self):
+        self._flush_pending()
+        was_fonttbl = self.in_fonttbl
+        if self.stack:
+            self.skip, self.uc, self.codepage, self.in_fonttbl = self.stack.pop()
+        self.group_start = False
+        self.star = False
+        self.uc_skip = 0
+        # После таблицы шрифтов текст по умолчанию идёт в кодировке \deff
+        if was_fonttbl and not self.in_fonttbl and self.deff in self.font_codepages:
+            self.codepage = self.font_codepages[self.deff]
+
+    # ---------- управляющие слова ----------
+
+    def _control_word(self, word, param):
+        if self.group_start:
+            self.group_start = False
+            if word == b"fonttbl":
+                self.skip = True
+                self.in_fonttbl = True
+                return
+            if self.star or word in SKIP_DESTINATIONS:
+                self.skip = True
+                return
+
+        if self.uc_skip:
+            self.uc_skip -= 1
+            return
+
+        text = CONTROL_TEXT.get(word)
+        if text is not None:
+            self._emit(text)
+        elif word == b"u" and param is not None:
+            self._unicode(param)
+        elif word == b"f" and param is not None:
+            if self.in_fonttbl:
+                self.font_num = param
+            else:
+                self._flush_pending()
+                self.codepage = self.font_codepages.get(param)
+        elif word == b"fcharset" and param is not None and self.in_fonttbl and self.font_num is not None:
+            codepage = CHARSET_CODEPAGES.get(param)
+            if codepage is not None:
+                self.font_codepages[self.font_num] = codepage
+        elif word == b"cpg" and param is not None and self.in_fonttbl and self.font_num is not None:
+            self.font_codepages[self.font_num] = param
+        elif word == b"ansicpg" and param is not None:
+            self._flush_pending()
+            self.default_codepage = param
+        elif word == b"deff" and param is not None:
+            self.deff = param
+        elif word == b"uc" and param is not None:
+            self.uc = param
+        elif word == b"bin" and param:
+            self.bin_remaining = param
+
+    def _unicode(self, value):
+        if value < 0:
+            value += 65536
+        self.uc_skip = self.uc
+        if 0xD800 <= value < 0xDC00:
+            self.high_surrogate = value
+            return
+        if 0xDC00 <= value < 0xE000 and self.high_surrogate is not None:
+            value = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (value - 0xDC00)
+        self.high_surrogate = None
+        self._emit(chr(value))
+
+    # ---------- разбор буфера ----------
+
+    def feed(self, buf, eof):
+        """Разбирает буфер, возвращает позицию, до которой он обработан.
+
+        Незавершённое управляющее слово в конце буфера (кроме последнего) не
+        трогается - его остаток придёт в следующем блоке.
+        """
+        pos, end = 0, len(buf)
+        while pos < end:
+            if self.bin_remaining:
+                taken = min(self.bin_remaining, end - pos)
+                self.bin_remaining -= taken
+                pos += taken
+                continue
+
+            match = TOKEN_RE.match(buf, pos)
+            if match is None:
+                # Одинокий "\" или неполный "\'x" в конце блока
+                if not eof and end - pos < 4:
+                    return pos
+                pos += 1
+                continue
+
+            word, param, hex_byte, symbol, brace = match.groups()
+            # Управляющее слово у самого конца блока может продолжиться (\u-1234, \par )
+            if not eof and (word is not None or symbol is not None) and match.end() + 1 >= end:
+                return pos
+            pos = match.end()
+
+            if word is not None:
+                self._control_word(word, int(param) if param is not None else None)
+            elif hex_byte is not None:
+                self.group_start = False
+                if self.uc_skip:
+                    self.uc_skip -= 1
+                elif not self.skip:
+                    self._emit_bytes(bytes.fromhex(hex_byte.decode("ascii")))
+            elif symbol is not None:
+                if symbol == b"*":
+                    self.star = True
+                    continue
+                self.group_start = False
+                if self.uc_skip:
+                    self.uc_skip -= 1
+                elif symbol in CONTROL_SYMBOLS:
+                    self._emit(CONTROL_SYMBOLS[symbol])
+            elif brace is not None:
+                if brace == b"{":
+                    self._push()
+                else:
+                    self._pop()
+            else:
+                data = match.group(0)
+                if data[0] in b"\r\n":
+                    continue
+                self.group_start = False
+                if self.skip:
+                    continue
+                if self.uc_skip:
+                    skipped = min(self.uc_skip, len(data))
+                    self.uc_skip -= skipped
+                    data = data[skipped:]
+                if data.isascii():
+                    self._emit(data.decode("ascii"))
+                else:
+                    self._emit_bytes(data)
+        return pos
+
+
+def iter_rtf_text(stream, chunk_size=CHUNK_SIZE):
+    """Потоково выдает текст RTF из бинарного потока, память не зависит от размера файла"""
+    decoder = RtfDecoder()
+    buf = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+        buf = buf[decoder.feed(buf, eof):]
+        text = decoder.take_output()
+        if text:
+            yield text
+        if eof:
+            break
+
+
+def convert_rtf_file(src_file, txt_file):
+    """Конвертирует RTF в UTF-8 текст блоками. Возвращает количество символов"""
+    written = 0
+    with open(src_file, 'rb') as src, open(txt_file, 'w', encoding='utf-8') as out:
+        for text in iter_rtf_text(src):
+            out.write(text)
+            written += len(text)
+    return written
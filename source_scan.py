@@ -0,0 +1,100 @@
+import os
+import json
+from pathlib import Path
+
+
+class SourceScan:
+    """Потоковый обход папки с исходными файлами.
+
+    Файлы выдаются по мере чтения каталога через os.scandir (тип берётся из
+    DirEntry без отдельного stat), так что конвертация начинается сразу, а
+    список всех файлов в памяти не строится. Рядом с state_file хранятся:
+    - state_file (JSON): число файлов в последнем полном проходе - примерная
+      длина прогресс-бара;
+    - курсор (state_file с суффиксом .cursor): имена уже обработанных в текущем
+      проходе файлов. После прерывания они пропускаются, по окончании прохода
+      курсор удаляется.
+    Если пропускаемые имена ведёт вызывающий код (done), курсор не используется.
+    """
+
+    def __init__(self, directory, state_file, extensions=None, done=None):
+        self.directory = Path(directory)
+        self.state_file = Path(state_file)
+        self.cursor_file = self.state_file.with_suffix(".cursor") if done is None else None
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self.done = self._load_cursor() if done is None else set(done)
+        self.estimated_total = self._load_total()
+        self.seen = 0  # Подходящих файлов найдено в этом проходе (включая пропущенные по курсору)
+        self.complete = False  # Каталог прочитан до конца
+        self._cursor = None
+
+    def _load_cursor(self):
+        try:
+            with open(self.cursor_file, 'r', encoding='utf-8') as f:
+                return {line.rstrip("\n") for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def _load_total(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get("total")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @property
+    def resumed(self):
+        return bool(self.done)
+
+    def remaining_estimate(self):
+        """Примерное число файлов, которые ещё предстоит обработать (None, если неизвестно)"""
+        if self.estimated_total is None:
+            return None
+        return max(self.estimated_total - len(self.done), 0)
+
+    def __iter__(self):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if self.extensions and not entry.name.lower().endswith(self.extensions):
+                    continue
+                self.seen += 1
+                if entry.name in self.done:
+                    continue
+                yield Path(entry.path)
+        self.complete = True
+
+    def mark_done(self, filepath):
+        """Отмечает файл обработанным в курсоре (после конвертации, успешной или нет)"""
+        if self._cursor is None:
+            self.cursor_file.parent.mkdir(exist_ok=True, parents=True)
+            self._cursor = open(self.cursor_file, 'a', encoding='utf-8', buffering=1)
+        self._cursor.write(Path(filepath).name + "\n")
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+    def finish(self):
+        """Вызывается после обработки всех выданных файлов.
+
+        Если каталог прочитан до конца, запоминает число файлов и удаляет курсор,
+        иначе (прерванный или ограниченный проход) курсор остаётся для продолжения.
+        """
+        self.close()
+        if not self.complete:
+            return
+        self.state_file.parent.mkdir(exist_ok=True, parents=True)
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump({"total": self.seen}, f)
+        if self.cursor_file is not None:
+            try:
+                self.cursor_file.unlink()
+            except FileNotFoundError:
+                pass
+        self.done = set()
@@ -0,0 +1,333 @@
+import io
+import os
+import re
+import sys
+import json
+import hashlib
+import struct
+import argparse
+from collections import Counter, deque
+from pathlib import Path
+
+try:
+    import zstandard  # Необязательно: сжатый вывод .txt.zst
+except ImportError:
+    zstandard = None
+
+# ================== КОНФИГУРАЦИЯ ==================
+TXT_DIR = Path("data/test_txt")  # Корпус TXT для поиска шаблонных строк
+BOILERPLATE_FILE = Path("data/boilerplate_lines.json")  # Список шаблонных строк (JSON-массив, можно править руками)
+COMPRESS_OUTPUT = False  # Писать .txt.zst вместо .txt (нужен пакет zstandard)
+ZSTD_LEVEL = 10
+MAX_BLANK_LINES = 1  # Сколько пустых строк подряд оставлять
+BOILERPLATE_EDGE_LINES = 5  # Шаблонные строки ищем среди первых и последних N строк документа...
+BOILERPLATE_MIN_SHARE = 0.05  # ...встречающиеся хотя бы в такой доле документов...
+BOILERPLATE_MIN_DOCS = 20  # ...и не реже, чем в N документах
+BOILERPLATE_MAX_LEN = 200  # Длинные строки шаблонными не считаем
+MAX_CANDIDATES = 500_000  # Предел словаря кандидатов при поиске (реже встречающиеся отбрасываются)
+
+NORMALIZER_VERSION = "norm-2"  # Менять при изменении правил нормализации
+COMPRESSED_SUFFIX = ".zst"
+COMPRESSED_MAGIC = b"GSTXT\x01"  # Заголовок сжатого файла: магия, длина JSON (uint32 LE), JSON, кадр zstd
+TXT_SUFFIXES = (".txt" + COMPRESSED_SUFFIX, ".txt")  # Готовый TXT: сжатый или обычный (длинный суффикс первым)
+
+# Пробельные символы, которые схлопываются в один пробел (перевод страницы делит строку)
+WHITESPACE_RE = re.compile(r'[ \t\v\xa0\u2000-\u200b\u202f\u205f\u3000\ufeff]+')
+
+_boilerplate = None  # Загруженный список шаблонных строк
+_boilerplate_digest = None  # Хеш загруженного списка (для версии вывода)
+
+
+# ================== НОРМАЛИЗАЦИЯ ==================
+
+def normalize_line(line):
+    return WHITESPACE_RE.sub(' ', line).strip()
+
+
+def boilerplate_key(line):
+    return line.casefold()
+
+
+def split_lines(lines):
+    """Нормализованные строки; перевод страницы (\\f) считается концом строки"""
+    for line in lines:
+        for part in line.rstrip('\r\n').split('\f'):
+            yield normalize_line(part)
+
+
+def is_edge_candidate(line):
+    """Строка, которая считается при отсчёте первых/последних строк документа"""
+    return bool(line) and len(line) <= BOILERPLATE_MAX_LEN
+
+
+def strip_edge_boilerplate(lines, boilerplate, count=BOILERPLATE_EDGE_LINES):
+    """Нормализованные строки без шаблонных среди первых и последних count строк (как в edge_lines).
+
+    Убираются только колонтитулы: та же строка в середине документа остаётся.
+    Для конца документа держится буфер, пока в нём больше count строк-кандидатов.
+    """
+    if not boilerplate:
+        yield from split_lines(lines)
+        return
+    head = 0
+    tail = deque()
+    tail_candidates = 0
+    for line in split_lines(lines):
+        candidate = is_edge_candidate(line)
+        if head < count:
+            if candidate:
+                head += 1
+                if boilerplate_key(line) in boilerplate:
+                    continue
+            yield line
+            continue
+        tail.append(line)
+        if candidate:
+            tail_candidates += 1
+            if tail_candidates > count:
+                # Первый кандидат буфера уже не среди последних count - выводим его и всё перед ним
+                while not is_edge_candidate(tail[0]):
+                    yield tail.popleft()
+                yield tail.popleft()
+                tail_candidates -= 1
+    for line in tail:
+        if is_edge_candidate(line) and boilerplate_key(line) in boilerplate:
+            continue
+        yield line
+
+
+def normalize_lines(lines, boilerplate=frozenset()):
+    """Потоковая нормализация: схлопывает пробелы и пустые строки, убирает шаблонные строки колонтитулов"""
+    blank = 0
+    started = False
+    for line in strip_edge_boilerplate(lines, boilerplate):
+        if not line:
+            blank += 1
+            continue
+        # Пустые строки в начале и в конце документа не выводим
+        if started:
+            yield '\n' * min(blank, MAX_BLANK_LINES)
+        yield line + '\n'
+        blank = 0
+        started = True
+
+
+def load_boilerplate(path=BOILERPLATE_FILE):
+    """Шаблонные строки из BOILERPLATE_FILE (нет файла - пустой набор); читается один раз"""
+    global _boilerplate
+    if _boilerplate is None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                _boilerplate = frozenset(boilerplate_key(line) for line in json.load(f))
+        except FileNotFoundError:
+            _boilerplate = frozenset()
+    return _boilerplate
+
+
+def output_path(txt_path, compress=COMPRESS_OUTPUT):
+    """Итоговый путь нормализованного файла (.txt или .txt.zst)"""
+    txt_path = Path(txt_path)
+    if compress and zstandard is not None:
+        return txt_path.with_name(txt_path.name + COMPRESSED_SUFFIX)
+    return txt_path
+
+
+def boilerplate_digest():
+    """Короткий хеш списка шаблонных строк: повторный detect меняет результат нормализации"""
+    global _boilerplate_digest
+    if _boilerplate_digest is None:
+        data = "\n".join(sorted(load_boilerplate())).encode('utf-8')
+        _boilerplate_digest = hashlib.md5(data).hexdigest()[:12]
+    return _boilerplate_digest
+
+
+def output_tag(compress=COMPRESS_OUTPUT):
+    """Версия вывода для ключа кэша конвертаций: меняется с правилами, списком шаблонных строк и форматом"""
+    return (f"{NORMALIZER_VERSION}+{boilerplate_digest()}"
+            + (COMPRESSED_SUFFIX if output_path("x", compress).suffix == COMPRESSED_SUFFIX else ""))
+
+
+def _write_header(f, metadata):
+    data = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+    f.write(COMPRESSED_MAGIC + struct.pack('<I', len(data)) + data)
+
+
+def read_header(f):
+    """Метаданные сжатого файла (поток остаётся на начале кадра zstd) или None для обычного TXT"""
+    magic = f.read(len(COMPRESSED_MAGIC))
+    if magic != COMPRESSED_MAGIC:
+        f.seek(0)
+        return None
+    (length,) = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(length).decode('utf-8'))
+
+
+def split_txt_name(name):
+    """(имя без суффикса, суффикс .txt или .txt.zst) или None, если файл не TXT"""
+    lower = name.lower()
+    for suffix in TXT_SUFFIXES:
+        if lower.endswith(suffix):
+            return name[:-len(suffix)], name[-len(suffix):]
+    return None
+
+
+def txt_exists(txt_path):
+    """Занято ли имя TXT: есть x.txt или его сжатый вариант x.txt.zst"""
+    txt_path = Path(txt_path)
+    stem = split_txt_name(txt_path.name)[0]
+    return any((txt_path.parent / (stem + suffix)).exists() for suffix in TXT_SUFFIXES)
+
+
+def open_content(path):
+    """Открывает TXT на чтение как байты текста (сжатый .txt.zst - распакованным потоком)"""
+    f = open(path, 'rb')
+    if read_header(f) is None:
+        return f
+    if zstandard is None:
+        f.close()
+        raise RuntimeError(f"Для чтения {path} нужен пакет zstandard")
+    return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+
+
+def open_text(path):
+    """Открывает TXT на чтение как текст - обычный или сжатый .txt.zst"""
+    return io.TextIOWrapper(open_content(path), encoding='utf-8', errors='replace')
+
+
+def normalize_file(txt_path, boilerplate=None, compress=COMPRESS_OUTPUT):
+    """Нормализует TXT на месте (через временный файл). Возвращает (итоговый путь, байт до, байт после).
+
+    При сжатии результат пишется в .txt.zst с заголовком, исходный .txt удаляется.
+    """
+    txt_path = Path(txt_path)
+    if boilerplate is None:
+        boilerplate = load_boilerplate()
+    target = output_path(txt_path, compress)
+    tmp = target.with_name(f".{target.name}.tmp")
+    size_before = txt_path.stat().st_size
+
+    try:
+        with open(txt_path, 'r', encoding='utf-8', errors='replace') as src, open(tmp, 'wb') as raw:
+            if target == txt_path:
+                with io.TextIOWrapper(raw, encoding='utf-8', newline='\n') as dst:
+                    dst.writelines(normalize_lines(src, boilerplate))
+            else:
+                _write_header(raw, {"source": txt_path.name, "size": size_before, "normalizer": NORMALIZER_VERSION,
+                                    "boilerplate_lines": len(boilerplate), "encoding": "utf-8"})
+                writer = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+                with io.TextIOWrapper(writer, encoding='utf-8', newline='\n') as dst:
+                    dst.writelines(normalize_lines(src, boilerplate))
+        os.replace(tmp, target)
+    except BaseException:
+        # Недописанный временный файл не оставляем
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+    if target != txt_path:
+        os.remove(txt_path)
+    return target, size_before, target.stat().st_size
+
+
+# ================== ПОИСК ШАБЛОННЫХ СТРОК ==================
+
+def iter_txt_files(txt_dir):
+    """TXT-файлы папки с подпапками (обычные и сжатые)"""
+    pending = [str(txt_dir)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.lower().endswith(TXT_SUFFIXES) and entry.is_file():
+                    yield Path(entry.path)
+
+
+def edge_lines(lines, count=BOILERPLATE_EDGE_LINES):
+    """Ключи первых и последних count непустых строк документа (потоково)"""
+    head, tail = [], []
+    for line in split_lines(lines):
+        if not is_edge_candidate(line):
+            continue
+        if len(head) < count:
+            head.append(line)
+        else:
+            tail.append(line)
+            if len(tail) > count:
+                tail.pop(0)
+    return {boilerplate_key(line) for line in head + tail}
+
+
+def detect_boilerplate(txt_dir=TXT_DIR, min_share=BOILERPLATE_MIN_SHARE, min_docs=BOILERPLATE_MIN_DOCS):
+    """Строки из начала/конца документов, повторяющиеся по всему корпусу, от частых к редким"""
+    counts = Counter()
+    documents = 0
+    for path in iter_txt_files(txt_dir):
+        try:
+            with open_text(path) as f:
+                counts.update(edge_lines(f))
+        except (OSError, RuntimeError) as e:
+            print(f"⚠️ {path.name}: {e}")
+            continue
+        documents += 1
+        if len(counts) > MAX_CANDIDATES:
+            # Строки, встретившиеся один раз, шаблонными уже не станут с заметной вероятностью
+            counts = Counter({key: n for key, n in counts.items() if n > 1})
+
+    threshold = max(min_docs, min_share * documents)
+    return documents, [(line, n) for line, n in counts.most_common() if n >= threshold]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Нормализация TXT-корпуса")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    detect = commands.add_parser("detect", help="Найти шаблонные строки и записать их в JSON")
+    detect.add_argument("--dir", type=Path, default=TXT_DIR)
+    detect.add_argument("--out", type=Path, default=BOILERPLATE_FILE)
+    detect.add_argument("--min-share", type=float, default=BOILERPLATE_MIN_SHARE)
+    detect.add_argument("--min-docs", type=int, default=BOILERPLATE_MIN_DOCS)
+
+    normalize = commands.add_parser("normalize", help="Нормализовать уже готовые TXT на месте")
+    normalize.add_argument("--dir", type=Path, default=TXT_DIR)
+    normalize.add_argument("--compress", action="store_true", default=COMPRESS_OUTPUT,
+                           help="Сжимать в .txt.zst (нужен zstandard)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "detect":
+        documents, lines = detect_boilerplate(args.dir, args.min_share, args.min_docs)
+        args.out.parent.mkdir(exist_ok=True, parents=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump([line for line, _ in lines], f, ensure_ascii=False, indent=1)
+        print(f"📄 Документов: {documents}, шаблонных строк: {len(lines)} -> {args.out}")
+        for line, n in lines[:20]:
+            print(f"{n:>8}  {line}")
+        return 0
+
+    if args.compress and zstandard is None:
+        print("❌ Для сжатия нужен пакет zstandard (pip install zstandard)")
+        return 1
+    total_before = total_after = files = 0
+    for path in iter_txt_files(args.dir):
+        if path.name.endswith(COMPRESSED_SUFFIX):
+            continue
+        try:
+            _, before, after = normalize_file(path, compress=args.compress)
+        except OSError as e:
+            print(f"⚠️ {path.name}: {e}")
+            continue
+        files += 1
+        total_before += before
+        total_after += after
+    print(f"✅ Файлов: {files}, {total_before / 1024 / 1024:.1f} МБ -> {total_after / 1024 / 1024:.1f} МБ")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
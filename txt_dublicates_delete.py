@@ -4,7 +4,11 @@ import hashlib
 from pathlib import Path
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+from conversion_cache import compute_file_hash
+from file_index import get_file_index, indexed_files
+from text_normalize import COMPRESSED_SUFFIX, TXT_SUFFIXES, open_content, split_txt_name, txt_exists
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,7 +24,9 @@ logger = logging.getLogger(__name__)
 # Конфигурация
 TXT_DIR = Path(r"D:\vick\pycharm\parse-gorsud-php\data_final\test_txt").resolve()
 DUPLICATES_DIR = TXT_DIR.parent / (TXT_DIR.name + "_duplicates")
-TXT_EXT = ".txt"
+PARTIAL_HASH_SIZE = 64 * 1024  # Сколько байт с начала и с конца хешировать на втором шаге
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # Потоков чтения (работа упирается в диск, а не в CPU)
+USE_FILE_INDEX = True  # Брать размеры и уже посчитанные хеши из общего индекса (data/file_index.sqlite)
 
 
 def clean_filename(name: str) -> str:
@@ -33,39 +39,158 @@ def clean_filename(name: str) -> str:
     return name
 
 
-def get_file_key(path: Path) -> tuple:
-    """Получаем ключ для сравнения файлов: (очищенное имя без цифр, размер, хэш)"""
-    name = path.stem
-    cleaned = clean_filename(name)
+def get_base_name(path: Path) -> str:
+    """Очищенное имя без цифр для группировки"""
+    cleaned = clean_filename(split_txt_name(path.name)[0])
     # Убираем цифры из конца очищенного имени для группировки
     base_name = re.sub(r'[\s_]*\d+$', '', cleaned)
-    size = path.stat().st_size
-    h = hashlib.md5(path.read_bytes()).hexdigest()
-    return (base_name.lower(), size, h)
+    return base_name.lower()
+
+
+def get_partial_hash(path: Path, size: int) -> str:
+    """MD5 первых и последних PARTIAL_HASH_SIZE байт (для маленьких файлов - всего файла)"""
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        h.update(f.read(PARTIAL_HASH_SIZE))
+        if size > 2 * PARTIAL_HASH_SIZE:
+            f.seek(-PARTIAL_HASH_SIZE, os.SEEK_END)
+            h.update(f.read(PARTIAL_HASH_SIZE))
+        elif size > PARTIAL_HASH_SIZE:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def get_content_hash(path: Path) -> tuple:
+    """(размер, MD5) текста; сжатый .txt.zst читается распакованным"""
+    h = hashlib.md5()
+    size = 0
+    with open_content(path) as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+            size += len(block)
+    return size, h.hexdigest()
+
+
+def count_txt_files(directory: Path) -> int:
+    """Число TXT в папке (обычных и сжатых)"""
+    return sum(1 for f in directory.glob("*.txt*") if f.name.lower().endswith(TXT_SUFFIXES))
+
+
+def refine_groups(groups: dict, key_func, desc: str) -> dict:
+    """Делит группы-кандидаты по ключу, посчитанному в пуле потоков; одиночки отбрасываются"""
+    candidates = [(key, file) for key, files in groups.items() if len(files) > 1 for file in files]
+    refined = {}
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        futures = {pool.submit(key_func, key, file): (key, file) for key, file in candidates}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            key, file = futures[future]
+            try:
+                refined.setdefault(future.result(), []).append(file)
+            except Exception as e:
+                logger.error(f"Ошибка обработки файла {file.name}: {e}")
+    return {k: v for k, v in refined.items() if len(v) > 1}
+
+
+def scan_file_groups(txt_dir: Path) -> tuple:
+    """Группы по (очищенное имя, размер) обходом папки: (группы, число файлов)"""
+    file_groups = {}
+    total = 0
+    with os.scandir(txt_dir) as entries:
+        for entry in tqdm(entries, desc="Анализ файлов"):
+            if not entry.name.lower().endswith(TXT_SUFFIXES):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                path = Path(entry.path)
+                key = (get_base_name(path), entry.stat().st_size)
+                file_groups.setdefault(key, []).append(path)
+                total += 1
+            except Exception as e:
+                logger.error(f"Ошибка обработки файла {entry.name}: {e}")
+    return file_groups, total
 
 
 def find_duplicate_groups(txt_dir: Path) -> dict:
-    """Находим группы дубликатов файлов"""
+    """Находим группы дубликатов файлов.
+
+    Полностью читаются только файлы, совпавшие по имени, размеру и хешу начала
+    и конца: сначала группировка по (имя, размер) без чтения содержимого, затем
+    хеш первых/последних 64 КБ, затем полный потоковый хеш. С общим индексом
+    уже известные полные хеши берутся из него, а новые сохраняются туда.
+    """
     logger.info(f"Поиск дубликатов в папке: {txt_dir}")
 
-    files = list(txt_dir.glob(f"*{TXT_EXT}"))
-    if not files:
+    # Шаг 1: (очищенное имя, размер) - только метаданные каталога
+    known_md5 = {}  # Полные хеши, уже сохраненные в общем индексе
+    if USE_FILE_INDEX:
+        file_groups = {}
+        total = 0
+        for indexed in tqdm(indexed_files(txt_dir, extensions=TXT_SUFFIXES), desc="Анализ файлов"):
+            key = (get_base_name(indexed.path), indexed.size)
+            file_groups.setdefault(key, []).append(indexed.path)
+            if indexed.md5:
+                known_md5[indexed.path] = indexed.md5
+            total += 1
+    else:
+        file_groups, total = scan_file_groups(txt_dir)
+
+    if not total:
         logger.warning("Нет файлов для обработки")
         return {}
-
-    logger.info(f"Найдено {len(files)} файлов для анализа")
-
-    # Собираем информацию о файлах с прогресс-баром
-    file_groups = {}
-    for file in tqdm(files, desc="Анализ файлов"):
-        try:
-            key = get_file_key(file)
-            file_groups.setdefault(key, []).append(file)
-        except Exception as e:
-            logger.error(f"Ошибка обработки файла {file.name}: {e}")
-
-    # Фильтруем только группы с дубликатами
-    duplicate_groups = {k: v for k, v in file_groups.items() if len(v) > 1}
+    logger.info(f"Найдено {total} файлов для анализа")
+
+    # Байты сжатого .txt.zst зависят от заголовка (в нём имя исходника): такие файлы и
+    # обычные TXT с тем же очищенным именем сравниваются по распакованному тексту
+    compressed_names = {key[0] for key, files in file_groups.items()
+                        if any(file.name.lower().endswith(COMPRESSED_SUFFIX) for file in files)}
+    content_candidates = {}
+    for key in [key for key in file_groups if key[0] in compressed_names]:
+        content_candidates.setdefault(key[0], []).extend(file_groups.pop(key))
+    content_groups = refine_groups(
+        content_candidates,
+        lambda name, file: (name, *get_content_hash(file)),
+        "Хеш текста"
+    )
+
+    # Группы, у всех файлов которых хеш уже есть в индексе, делятся без чтения файлов
+    cached_groups = {}
+    for key, files in list(file_groups.items()):
+        if len(files) > 1 and all(file in known_md5 for file in files):
+            del file_groups[key]
+            for file in files:
+                cached_groups.setdefault((*key, known_md5[file]), []).append(file)
+
+    # Шаг 2: хеш начала и конца файла
+    partial_groups = refine_groups(
+        file_groups,
+        lambda key, file: (*key, get_partial_hash(file, key[1])),
+        "Хеш начала/конца"
+    )
+
+    # Шаг 3: полный хеш - только для файлов больше двух блоков (меньшие уже прочитаны целиком)
+    small_groups = {k: v for k, v in partial_groups.items() if k[1] <= 2 * PARTIAL_HASH_SIZE}
+    large_groups = {k: v for k, v in partial_groups.items() if k[1] > 2 * PARTIAL_HASH_SIZE}
+    full_groups = refine_groups(
+        large_groups,
+        lambda key, file: (key[0], key[1], known_md5.get(file) or compute_file_hash(file)),
+        "Полный хеш"
+    )
+
+    # Ключ группы: (имя, размер, хеш)
+    duplicate_groups = {**small_groups, **full_groups}
+    duplicate_groups.update((k, v) for k, v in cached_groups.items() if len(v) > 1)
+
+    if USE_FILE_INDEX:
+        # Запоминаем посчитанные хеши, чтобы следующий проход не читал эти файлы
+        index = get_file_index()
+        for (_, _, filehash), files in duplicate_groups.items():
+            for file in files:
+                if file not in known_md5:
+                    index.set_md5(file, filehash)
+        index.commit()
+    # Хеши распакованного текста в индекс не пишем: там MD5 самого файла
+    duplicate_groups.update(content_groups)
 
     logger.info(f"Найдено {len(duplicate_groups)} групп дубликатов")
     return duplicate_groups
@@ -90,39 +215,45 @@ def process_duplicates(duplicate_groups: dict, txt_dir: Path, duplicates_dir: Pa
 
             # Основной файл - первый в отсортированном списке
             main_file = files_sorted[0]
-            new_name = f"{clean_filename(main_file.stem)}{TXT_EXT}"
+            stem, suffix = split_txt_name(main_file.name)
+            new_name = f"{clean_filename(stem)}{suffix}"
             new_path = txt_dir / new_name
 
             # Переименовываем основной файл (если требуется)
             if main_file.name != new_name:
-                # Проверяем, не существует ли уже файл с таким именем
+                # Проверяем, не существует ли уже файл с таким именем (x.txt и x.txt.zst занимают одно имя)
                 counter = 1
-                while new_path.exists() and new_path != main_file:
-                    new_name = f"{clean_filename(main_file.stem)}({counter}){TXT_EXT}"
+                while txt_exists(new_path) and new_path != main_file:
+                    new_name = f"{clean_filename(stem)}({counter}){suffix}"
                     new_path = txt_dir / new_name
                     counter += 1
 
                 logger.info(f"Переименовываем: {main_file.name} -> {new_path.name}")
                 main_file.rename(new_path)
+                if USE_FILE_INDEX:
+                    get_file_index().moved(main_file, new_path)
 
             # Перемещаем дубликаты
             for duplicate in files_sorted[1:]:
                 dest = duplicates_dir / duplicate.name
                 # Убедимся, что имя уникально в папке дубликатов
                 counter = 1
+                duplicate_stem, duplicate_suffix = split_txt_name(duplicate.name)
                 while dest.exists():
-                    stem = duplicate.stem
-                    ext = duplicate.suffix
-                    dest = duplicates_dir / f"{stem}({counter}){ext}"
+                    dest = duplicates_dir / f"{duplicate_stem}({counter}){duplicate_suffix}"
                     counter += 1
 
                 logger.info(f"Перемещаем дубликат: {duplicate.name} -> {dest}")
                 shutil.move(str(duplicate), str(dest))
+                if USE_FILE_INDEX:
+                    get_file_index().moved(duplicate, dest)
                 processed += 1
 
         except Exception as e:
             logger.error(f"Ошибка обработки группы {base_name}: {e}")
 
+    if USE_FILE_INDEX:
+        get_file_index().commit()
     logger.info(f"Обработано дубликатов: {processed} из {total_duplicates}")
 
 
@@ -143,8 +274,8 @@ def main():
     process_duplicates(duplicate_groups, TXT_DIR, DUPLICATES_DIR)
 
     # Финализация
-    remaining_files = len(list(TXT_DIR.glob(f"*{TXT_EXT}")))
-    moved_files = len(list(DUPLICATES_DIR.glob(f"*{TXT_EXT}"))) if DUPLICATES_DIR.exists() else 0
+    remaining_files = count_txt_files(TXT_DIR)
+    moved_files = count_txt_files(DUPLICATES_DIR) if DUPLICATES_DIR.exists() else 0
 
     logger.info("=" * 50)
     logger.info(f"Обработка завершена")
@@ -0,0 +1,259 @@
+import os
+import re
+import csv
+import shutil
+import hashlib
+import logging
+from array import array
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+from text_normalize import TXT_SUFFIXES, open_text, split_txt_name
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('near_duplicates.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Конфигурация
+TXT_DIR = Path(r"D:\vick\pycharm\parse-gorsud-php\data_final\test_txt").resolve()
+NEAR_DUPLICATES_DIR = TXT_DIR.parent / (TXT_DIR.name + "_near_duplicates")
+REPORT_FILE = Path("near_duplicates_report.csv")
+MODE = "report"  # "report" - только отчет, "move" - перемещать почти-дубликаты
+JACCARD_THRESHOLD = 0.8  # Минимальное сходство наборов шинглов для почти-дубликата
+SHINGLE_SIZE = 5  # Шингл - N подряд идущих слов
+NUM_PERM = 128  # Длина MinHash-подписи
+BANDS = 16  # LSH: подпись режется на BANDS полос по NUM_PERM // BANDS значений
+WORKERS = os.cpu_count() or 1  # Процессов для подсчета подписей
+
+ROWS = NUM_PERM // BANDS
+WORD_RE = re.compile(r'\w+')
+EMPTY_BIN = 0xFFFFFFFF
+
+
+def get_shingle_hashes(text: str) -> set:
+    """64-битные хеши шинглов из слов текста (регистр, пунктуация и пробелы не важны)"""
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return set()
+    count = max(len(words) - SHINGLE_SIZE + 1, 1)
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE_SIZE]).encode('utf-8'),
+                                       digest_size=8).digest(), 'little')
+        for i in range(count)
+    }
+
+
+def minhash_signature(hashes: set) -> bytes:
+    """MinHash-подпись из NUM_PERM значений за один проход по шинглам.
+
+    Вместо NUM_PERM независимых перестановок хеш шингла делится на корзину
+    (младшие биты) и значение: в подписи минимум значения по каждой корзине
+    (one permutation hashing). Пустые корзины заполняются из следующей
+    непустой со сдвигом, чтобы доля совпавших позиций оставалась оценкой
+    коэффициента Жаккара.
+    """
+    bins = [EMPTY_BIN] * NUM_PERM
+    for h in hashes:
+        index = h % NUM_PERM
+        value = (h // NUM_PERM) & 0xFFFFFFFF
+        if value < bins[index]:
+            bins[index] = value
+
+    if EMPTY_BIN in bins and len(set(bins)) > 1:
+        filled = list(bins)
+        for i in range(NUM_PERM):
+            if bins[i] != EMPTY_BIN:
+                continue
+            distance = 1
+            while bins[(i + distance) % NUM_PERM] == EMPTY_BIN:
+                distance += 1
+            filled[i] = (bins[(i + distance) % NUM_PERM] + distance * 0x9E3779B1) & 0xFFFFFFFF
+        bins = filled
+    return array('I', bins).tobytes()
+
+
+def compute_signature(path: str):
+    """Подпись одного файла (выполняется в процессе пула)"""
+    try:
+        with open_text(path) as f:
+            hashes = get_shingle_hashes(f.read())
+        if not hashes:
+            return None
+        return minhash_signature(hashes)
+    except (OSError, RuntimeError):
+        return None
+
+
+def estimate_similarity(sig_a: bytes, sig_b: bytes) -> float:
+    """Оценка коэффициента Жаккара по подписям"""
+    a, b = array('I', sig_a), array('I', sig_b)
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def find_near_duplicate_groups(txt_dir: Path) -> list:
+    """Находим группы почти-дубликатов: список списков (путь, подпись)"""
+    logger.info(f"Поиск почти-дубликатов в папке: {txt_dir}")
+
+    with os.scandir(txt_dir) as entries:
+        paths = [entry.path for entry in entries if entry.name.lower().endswith(TXT_SUFFIXES) and entry.is_file()]
+    if not paths:
+        logger.warning("Нет файлов для обработки")
+        return []
+    logger.info(f"Найдено {len(paths)} файлов для анализа")
+
+    # Шаг 1: MinHash-подписи (CPU, поэтому в процессах)
+    files, signatures = [], []
+    with ProcessPoolExecutor(max_workers=WORKERS) as pool:
+        results = pool.map(compute_signature, paths, chunksize=64)
+        for path, signature in tqdm(zip(paths, results), total=len(paths), desc="Подписи"):
+            if signature is not None:
+                files.append(Path(path))
+                signatures.append(signature)
+
+    # Шаг 2: LSH - кандидаты только внутри совпавших полос, по одной полосе за раз
+    uf = UnionFind(len(files))
+    band_bytes = ROWS * 4
+    compared = 0
+    for band in tqdm(range(BANDS), desc="LSH-полосы"):
+        buckets = {}
+        start = band * band_bytes
+        for i, signature in enumerate(signatures):
+            buckets.setdefault(signature[start:start + band_bytes], []).append(i)
+
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # Сравниваем с "лидерами" корзины, а не все пары: большие корзины не квадратичны
+            leaders = []
+            for i in members:
+                for leader in leaders:
+                    if uf.find(i) == uf.find(leader):
+                        break
+                    compared += 1
+                    if estimate_similarity(signatures[i], signatures[leader]) >= JACCARD_THRESHOLD:
+                        uf.union(i, leader)
+                        break
+                else:
+                    leaders.append(i)
+    logger.info(f"Проверено пар-кандидатов: {compared}")
+
+    groups = {}
+    for i in range(len(files)):
+        groups.setdefault(uf.find(i), []).append(i)
+    near_groups = [[(files[i], signatures[i]) for i in members]
+                   for members in groups.values() if len(members) > 1]
+
+    logger.info(f"Найдено {len(near_groups)} групп почти-дубликатов")
+    return near_groups
+
+
+def process_near_duplicates(near_groups: list, duplicates_dir: Path, mode: str = MODE):
+    """Пишем отчет и (в режиме move) перемещаем почти-дубликаты.
+
+    Из группы остается самый большой файл: обычно в нем больше всего текста.
+    Группы собираются по цепочкам (A~B, B~C), поэтому перемещаются только файлы,
+    похожие на оставляемый не меньше JACCARD_THRESHOLD; остальные попадают в
+    отчет как "related" и остаются на месте.
+    """
+    if not near_groups:
+        logger.info("Почти-дубликаты не найдены")
+        return
+
+    if mode == "move":
+        duplicates_dir.mkdir(exist_ok=True)
+        logger.info(f"Папка для почти-дубликатов: {duplicates_dir}")
+
+    total_duplicates = 0
+    total_related = 0
+    processed = 0
+
+    with open(REPORT_FILE, 'w', encoding='utf-8', newline='') as report:
+        writer = csv.writer(report)
+        writer.writerow(["group", "role", "file", "size", "similarity"])
+
+        for group_id, group in enumerate(tqdm(near_groups, desc="Обработка почти-дубликатов"), 1):
+            try:
+                group = sorted(group, key=lambda item: (-item[0].stat().st_size, item[0].name))
+                main_file, main_signature = group[0]
+                writer.writerow([group_id, "keep", main_file.name, main_file.stat().st_size, "1.00"])
+
+                for duplicate, signature in group[1:]:
+                    similarity = estimate_similarity(main_signature, signature)
+                    is_duplicate = similarity >= JACCARD_THRESHOLD
+                    writer.writerow([group_id, "duplicate" if is_duplicate else "related", duplicate.name,
+                                     duplicate.stat().st_size, f"{similarity:.2f}"])
+                    if not is_duplicate:
+                        total_related += 1
+                        continue
+                    total_duplicates += 1
+                    if mode != "move":
+                        continue
+
+                    dest = duplicates_dir / duplicate.name
+                    # Убедимся, что имя уникально в папке почти-дубликатов (суффикс .txt или .txt.zst)
+                    stem, suffix = split_txt_name(duplicate.name)
+                    counter = 1
+                    while dest.exists():
+                        dest = duplicates_dir / f"{stem}({counter}){suffix}"
+                        counter += 1
+
+                    logger.info(f"Перемещаем почти-дубликат: {duplicate.name} -> {dest}")
+                    shutil.move(str(duplicate), str(dest))
+                    processed += 1
+            except Exception as e:
+                logger.error(f"Ошибка обработки группы {group_id}: {e}")
+
+    logger.info(f"Отчет: {REPORT_FILE}")
+    logger.info(f"Похожих только через цепочку (не перемещаются): {total_related}")
+    if mode == "move":
+        logger.info(f"Перемещено почти-дубликатов: {processed} из {total_duplicates}")
+    else:
+        logger.info(f"Почти-дубликатов в отчете: {total_duplicates}")
+
+
+def main():
+    logger.info("=" * 50)
+    logger.info("Запуск поиска почти-дубликатов")
+    logger.info(f"Исходная папка: {TXT_DIR}")
+    logger.info(f"Режим: {MODE}, порог Жаккара: {JACCARD_THRESHOLD}")
+
+    if not TXT_DIR.exists():
+        logger.error("Исходная папка не существует!")
+        return
+
+    # Шаг 1: Находим почти-дубликаты
+    near_groups = find_near_duplicate_groups(TXT_DIR)
+
+    # Шаг 2: Отчет / перемещение
+    process_near_duplicates(near_groups, NEAR_DUPLICATES_DIR, MODE)
+
+    logger.info("=" * 50)
+    logger.info("Обработка завершена")
+    logger.info("=" * 50)
+
+
+if __name__ == "__main__":
+    main()